@@ -0,0 +1,62 @@
+"""
+Memory benchmark: bytes per image for a list of ImageItems versus an ImageCatalog.
+
+Usage: python benchmarks/catalog_memory.py [--images 1000000] [--tags 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ImageItem, TagItem
+from image_catalog import ImageCatalog
+
+def synthetic_rows(count, tag_count, seed=0):
+    """
+    Yield (id, filepath, width, height, tag_ids) rows resembling a real library.
+    """
+    rng = random.Random(seed)
+    for image_id in range(1, count + 1):
+        folder = image_id // 1000
+        filepath = f"/home/user/Pictures/library/{folder:04d}/IMG_{image_id:08d}.jpg"
+        tag_ids = tuple(sorted(rng.sample(range(1, tag_count + 1), rng.randint(0, 3))))
+        yield image_id, filepath, 6000, 4000, tag_ids
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=1000000)
+    parser.add_argument('--tags', type=int, default=50)
+    args = parser.parse_args()
+    tags = [TagItem(id=tag_id, name=f"tag-{tag_id}") for tag_id in range(1, args.tags + 1)]
+    names = {tag.id: tag.name for tag in tags}
+
+    def build_items():
+        # Tag names are fresh strings per row, as sqlite3 returns them
+        return [ImageItem(image_id, filepath, width, height, [''.join(names[t]) for t in tag_ids])
+                for image_id, filepath, width, height, tag_ids in synthetic_rows(args.images, args.tags)]
+
+    def build_catalog():
+        catalog = ImageCatalog(tags)
+        for image_id, filepath, width, height, tag_ids in synthetic_rows(args.images, args.tags):
+            catalog.append(image_id, filepath, width, height, tag_ids)
+        return catalog
+
+    items, items_bytes = measure(build_items)
+    del items
+    catalog, catalog_bytes = measure(build_catalog)
+    print(f"images:       {args.images}")
+    print(f"ImageItem:    {items_bytes / args.images:8.1f} bytes/image")
+    print(f"ImageCatalog: {catalog_bytes / args.images:8.1f} bytes/image")
+
+if __name__ == '__main__':
+    main()
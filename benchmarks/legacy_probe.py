@@ -0,0 +1,64 @@
+"""
+The header parser image_probe replaced, kept verbatim as the reference for the
+probe.get_image_size_legacy benchmark: one open for the header, a second open for
+JPEGs, and the JPEG markers scanned with f.read(1) calls. TIFF and WebP give (0, 0).
+"""
+from typing import Tuple
+
+def get_image_size(path: str) -> Tuple[int, int]:
+    """
+    Get image size (width, height) without external libraries.
+    Supports JPEG, PNG, GIF, BMP formats.
+    Returns (0, 0) if cannot determine.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(26)
+    except Exception:
+        return 0, 0
+
+    # PNG: signature is 8 bytes
+    if header[:8] == b'\211PNG\r\n\032\n':
+        # IHDR chunk starts at byte 12
+        if header[12:16] == b'IHDR':
+            width = int.from_bytes(header[16:20], 'big')
+            height = int.from_bytes(header[20:24], 'big')
+            return width, height
+
+    # JPEG: starts with 0xFFD8
+    if header[:2] == b'\xff\xd8':
+        try:
+            with open(path, 'rb') as f:
+                f.read(2)
+                b = f.read(1)
+                while b and b != b'\xFF':
+                    b = f.read(1)
+                while b == b'\xFF':
+                    marker = f.read(1)
+                    if not marker:
+                        break
+                    if 0xC0 <= marker[0] <= 0xC3:
+                        f.read(3)  # skip length and precision
+                        h = int.from_bytes(f.read(2), 'big')
+                        w = int.from_bytes(f.read(2), 'big')
+                        return w, h
+                    else:
+                        length = int.from_bytes(f.read(2), 'big')
+                        f.read(length - 2)
+                    b = f.read(1)
+        except Exception:
+            return 0, 0
+
+    # GIF: first 6 bytes are signature, next 4 bytes are width and height (little-endian)
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        width = int.from_bytes(header[6:8], 'little')
+        height = int.from_bytes(header[8:10], 'little')
+        return width, height
+
+    # BMP: starts with 'BM', width and height at offsets 18 and 22 (little-endian)
+    if header[:2] == b'BM':
+        width = int.from_bytes(header[18:22], 'little')
+        height = int.from_bytes(header[22:26], 'little')
+        return width, height
+
+    return 0, 0
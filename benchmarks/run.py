@@ -0,0 +1,300 @@
+"""
+Benchmark suite: times ingest, loading, tagging, groups, thumbnails and widget paths
+on a synthetic library, writes JSON results and compares them with a saved baseline.
+
+Usage:
+    python benchmarks/run.py --images 10000 --output results.json
+    python benchmarks/run.py --images 10000 --baseline baseline.json [--threshold 0.2]
+
+The library is generated once per parameter set under --workdir and reused.
+Qt benchmarks run with QT_QPA_PLATFORM=offscreen and are reported as skipped
+when PyQt5 is not installed. The exit status is 1 when any benchmark is slower
+than the baseline by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.legacy_probe import get_image_size as legacy_get_image_size
+from benchmarks.synthetic_library import generate, load_manifest
+from database import DatabaseManager
+from image_probe import get_image_size
+from tag_index import TagIndex
+from tag_queue import TagWriteQueue
+
+# Single-image operations timed per benchmark run
+TOGGLE_COUNT = 1000
+GROUP_COUNT = 100
+# Paths handed to sync_paths, as a folder watcher would after a burst of new files
+SYNC_PATH_COUNT = 1000
+# Rows read before the window shows images (controller.FIRST_PAGE_SIZE)
+FIRST_PAGE_SIZE = 500
+# Images decoded by the thumbnail and widget benchmarks
+THUMBNAIL_COUNT = 500
+
+class Suite:
+    """
+    Runs benchmark functions `repeat` times and collects the timings.
+    A benchmark may call skip(reason) to record that it could not run.
+    """
+
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: Dict[str, Dict] = {}
+
+    def measure(self, name: str, run: Callable[[], None], setup: Optional[Callable[[], None]] = None) -> None:
+        runs = []
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            run()
+            runs.append(time.perf_counter() - started)
+        self.results[name] = {"seconds": statistics.median(runs), "min": min(runs), "runs": runs}
+        print(f"{name:32s} {statistics.median(runs) * 1000:10.1f} ms", file=sys.stderr)
+
+    def skip(self, name: str, reason: str) -> None:
+        self.results[name] = {"skipped": reason}
+        print(f"{name:32s} skipped: {reason}", file=sys.stderr)
+
+def library_path(workdir: str, images: int, tags: int, density: float, seed: int) -> str:
+    path = os.path.join(workdir, f"library-{images}-{tags}-{density}-{seed}")
+    if not os.path.exists(os.path.join(path, 'manifest.json')):
+        shutil.rmtree(path, ignore_errors=True)
+        generate(path, images, tags, density, seed)
+    return path
+
+def run_database_benchmarks(suite: Suite, library: str, manifest: Dict, workdir: str) -> None:
+    db_path = os.path.join(workdir, 'bench.db')
+    paths = [os.path.join(library, name) for name in manifest["files"]]
+
+    def fresh_db():
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    suite.measure("probe.get_image_size", lambda: [get_image_size(path) for path in paths])
+    # The same files through the pre-image_probe parser, for the per-file cost comparison
+    suite.measure("probe.get_image_size_legacy", lambda: [legacy_get_image_size(path) for path in paths])
+    per_file = [suite.results[name]["seconds"] / len(paths) * 1e6
+                for name in ("probe.get_image_size", "probe.get_image_size_legacy")]
+    print(f"{'probe per file':32s} {per_file[0]:10.1f} us (legacy {per_file[1]:.1f} us)", file=sys.stderr)
+    suite.measure("ingest.add_folder", lambda: DatabaseManager(db_path).add_folder(library, recursive=True),
+                  setup=fresh_db)
+
+    db = DatabaseManager(db_path)
+    suite.measure("ingest.rescan_unchanged", lambda: db.rescan_folder(library, recursive=True))
+    suite.measure(f"ingest.sync_{SYNC_PATH_COUNT}_paths", lambda: db.sync_paths(paths[:SYNC_PATH_COUNT]))
+
+    # Apply the planned tags; later benchmarks read and toggle them
+    ids_by_path = {image.filepath: image.id for image in db.get_all_images()}
+    ids = [ids_by_path[path] for path in paths]
+    changes = []
+    for name, indexes in manifest["planned_tags"].items():
+        tag = db.get_or_create_tag(name)
+        changes.extend((ids[index], tag.id, True) for index in indexes)
+
+    def clear_tags():
+        with db.conn:
+            db.conn.execute("DELETE FROM image_tags")
+
+    suite.measure("tags.apply_planned", lambda: db.apply_tag_changes(changes), setup=clear_tags)
+
+    suite.measure("load.get_all_images", db.get_all_images)
+    suite.measure("load.get_image_catalog", db.get_image_catalog)
+    suite.measure(f"load.first_page_{FIRST_PAGE_SIZE}", lambda: db.get_image_catalog(limit=FIRST_PAGE_SIZE))
+    suite.measure("load.iter_image_catalog", lambda: [len(page) for page in db.iter_image_catalog()])
+    catalog = db.get_image_catalog()
+    tags = db.get_all_tags()
+    suite.measure("load.tag_index", lambda: TagIndex.from_catalog(catalog, tags))
+    index = TagIndex.from_catalog(catalog, tags)
+    query = " OR ".join(tag.name for tag in tags[:3]) + (f" AND NOT {tags[3].name}" if len(tags) > 3 else "")
+    suite.measure("query.tag_index", lambda: index.query_ids(query))
+    # What the grid is given for a filter: catalog rows straight from the bitmaps.
+    # About 45-55 ms for 400k matches, short of a 10 ms goal: every matching row
+    # still becomes one Python int on its way into the array('q')
+    suite.measure("query.tag_index_rows", lambda: index.query_rows(query))
+    # The same query answered by SQLite from image_tags, for comparison
+    def tagged(tag):
+        return f"id IN (SELECT image_id FROM image_tags WHERE tag_id = {tag.id})"
+    terms = [tagged(tag) for tag in tags[:3]] or ["1"]
+    if len(tags) > 3:
+        terms[-1] = f"({terms[-1]} AND NOT {tagged(tags[3])})"
+    sql = f"SELECT id FROM images WHERE {' OR '.join(terms)} ORDER BY id"
+    if [row[0] for row in db.conn.execute(sql)] != index.query_ids(query):
+        raise AssertionError("SQL and tag index disagree on " + query)
+    suite.measure("query.sql", lambda: db.conn.execute(sql).fetchall())
+
+    rng = random.Random(0)
+    toggles = [(rng.choice(ids), rng.choice(tags).id) for _ in range(TOGGLE_COUNT)]
+
+    def toggle_each():
+        for image_id, tag_id in toggles:
+            db.set_tag(image_id, tag_id, True)
+            db.set_tag(image_id, tag_id, False)
+
+    def toggle_queued():
+        queue = TagWriteQueue()
+        for image_id, tag_id in toggles:
+            queue.record(image_id, tag_id, True, False)
+        queue.flush(db)
+        for image_id, tag_id in toggles:
+            queue.record(image_id, tag_id, False, True)
+        queue.flush(db)
+
+    suite.measure(f"tags.toggle_{TOGGLE_COUNT}_set_tag", toggle_each)
+    suite.measure(f"tags.toggle_{TOGGLE_COUNT}_queued", toggle_queued)
+
+    group_run = [0]
+
+    def group_ops():
+        group_run[0] += 1
+        for number in range(GROUP_COUNT):
+            group_id = db.create_group(f"bench-{group_run[0]}-{number}")
+            members = ids[number * 10 % len(ids):][:10]
+            for image_id in members:
+                db.add_to_group(group_id, image_id)
+            db.get_group_images(group_id)
+            for image_id in members:
+                db.remove_from_group(group_id, image_id)
+
+    suite.measure(f"groups.ops_{GROUP_COUNT}_groups", group_ops)
+    db.conn.close()
+
+def run_qt_benchmarks(suite: Suite, library: str, manifest: Dict, workdir: str) -> None:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError as e:
+        for name in ("thumbnails.cold", "thumbnails.cached", "widget.grid_set_images", "widget.detail_set_image"):
+            suite.skip(name, f"PyQt5 not available ({e})")
+        return
+    from image_widget import ImageGrid, THUMBNAIL_SIZE
+    from detail_panel import DetailPanel
+    from thumbnail_cache import ThumbnailCache
+    from thumbnailer import load_thumbnail
+
+    app = QApplication.instance() or QApplication([])
+    decodable = [os.path.join(library, name) for name in manifest["files"]
+                 if name.endswith(('.png', '.bmp', '.tiff'))][:THUMBNAIL_COUNT]
+    cache_path = os.path.join(workdir, 'bench-thumbnails.db')
+
+    def fresh_cache():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    def build():
+        cache = ThumbnailCache(cache_path)
+        for path in decodable:
+            load_thumbnail(path, THUMBNAIL_SIZE, cache)
+        cache.flush()
+        cache.close()
+
+    suite.measure("thumbnails.cold", build, setup=fresh_cache)
+    suite.measure("thumbnails.cached", build)
+
+    db = DatabaseManager(os.path.join(workdir, 'bench.db'))
+    catalog = db.get_image_catalog()
+    grid = ImageGrid()
+    grid.resize(1200, 800)
+    grid.show()
+
+    def grid_set_images():
+        grid.set_images(catalog)
+        app.processEvents()
+
+    suite.measure("widget.grid_set_images", grid_set_images)
+    grid.thumbnailer.shutdown()
+
+    panel = DetailPanel()
+    panel.resize(800, 600)
+    panel.show()
+    images = [image for image in catalog if image.filepath.endswith(('.png', '.bmp', '.tiff'))][:50]
+
+    def show_images():
+        for image in images:
+            panel.set_image(image)
+            app.processEvents()
+
+    suite.measure("widget.detail_set_image", show_images)
+    db.conn.close()
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Return a line per benchmark slower than the baseline by more than threshold (a fraction).
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name, {})
+        if "seconds" not in result or "seconds" not in before or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        line = f"{name:32s} {before['seconds'] * 1000:10.1f} -> {result['seconds'] * 1000:10.1f} ms ({ratio - 1:+.0%})"
+        print(line, file=sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append(line)
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=10000)
+    parser.add_argument('--tags', type=int, default=50)
+    parser.add_argument('--density', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark; the median is reported")
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'tg-image-tagger-bench'))
+    parser.add_argument('--output', '-o', help="write results JSON here (default: stdout)")
+    parser.add_argument('--baseline', help="results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    parser.add_argument('--no-qt', action='store_true', help="skip thumbnail and widget benchmarks")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    library = library_path(args.workdir, args.images, args.tags, args.density, args.seed)
+    manifest = load_manifest(library)
+    suite = Suite(args.repeat)
+    run_database_benchmarks(suite, library, manifest, args.workdir)
+    if not args.no_qt:
+        run_qt_benchmarks(suite, library, manifest, args.workdir)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "images": args.images, "tags": args.tags, "density": args.density,
+            "seed": args.seed, "repeat": args.repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": suite.results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("images") != args.images:
+            print("warning: baseline was recorded with a different library size", file=sys.stderr)
+        regressions = compare(suite.results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}",
+                  file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
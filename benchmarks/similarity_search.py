@@ -0,0 +1,64 @@
+"""
+Near-duplicate search benchmark: PerceptualHashIndex versus a brute-force scan.
+
+Usage: python benchmarks/similarity_search.py [--images 1000000] [--queries 20] [--distance 10]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perceptual_hash import DEFAULT_SIMILAR_DISTANCE, PerceptualHashIndex
+
+def brute_force(hashes, value, max_distance):
+    return sorted((distance, image_id) for image_id, distance in
+                  ((image_id, (stored ^ value).bit_count()) for image_id, stored in hashes.items())
+                  if distance <= max_distance)
+
+def near_copy(value, rng, flips):
+    for position in rng.sample(range(64), flips):
+        value ^= 1 << position
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--distance', type=int, default=DEFAULT_SIMILAR_DISTANCE)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    started = time.perf_counter()
+    index = PerceptualHashIndex()
+    for image_id in range(1, args.images + 1):
+        index.add(image_id, rng.getrandbits(64))
+    # Plant a few near copies of each query image
+    queries = rng.sample(range(1, args.images + 1), args.queries)
+    next_id = args.images + 1
+    for image_id in queries:
+        for _ in range(3):
+            index.add(next_id, near_copy(index.get(image_id), rng, rng.randint(1, args.distance)))
+            next_id += 1
+    build = time.perf_counter() - started
+
+    index_time = brute_time = 0.0
+    for image_id in queries:
+        value = index.get(image_id)
+        started = time.perf_counter()
+        found = index.search(value, args.distance)
+        index_time += time.perf_counter() - started
+        started = time.perf_counter()
+        expected = brute_force(index.hashes, value, args.distance)
+        brute_time += time.perf_counter() - started
+        assert found == expected, (image_id, found, expected)
+
+    print(f"images:      {len(index)}")
+    print(f"build:       {build:8.2f} s")
+    print(f"index:       {index_time / args.queries * 1000:8.2f} ms/query")
+    print(f"brute force: {brute_time / args.queries * 1000:8.2f} ms/query")
+
+if __name__ == '__main__':
+    main()
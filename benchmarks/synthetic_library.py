@@ -0,0 +1,137 @@
+"""
+Deterministic synthetic image library for benchmarks.
+
+Writes N files of mixed formats and sizes under a folder (100 per subfolder) and
+a manifest.json with the generation parameters and the planned tags. The same
+parameters always produce byte-identical files with the same mtimes.
+
+PNG, BMP and TIFF files hold real pixels and can be decoded. JPEG, GIF and WebP
+files carry valid headers with padding up to a realistic size; header probing
+and ingest treat them like real files, but decoders reject them.
+
+Usage: python benchmarks/synthetic_library.py OUTPUT [--images 10000] [--tags 50] [--density 0.05]
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import zlib
+from typing import Dict, List
+
+FILES_PER_FOLDER = 100
+# Fixed modification time so rescans and cache keys are reproducible
+FIXED_MTIME = 1_600_000_000
+# Formats in generation order, with their share of the library
+FORMATS = (('jpg', 0.5), ('png', 0.2), ('webp', 0.1), ('gif', 0.05), ('bmp', 0.05), ('tiff', 0.1))
+# Largest edge of decodable images; kept small so the library stays compact on disk
+MAX_DECODABLE_EDGE = 256
+
+def _pixel_rows(width: int, height: int, rng: random.Random) -> List[bytes]:
+    """
+    RGB rows of a diagonal gradient; each row is a shifted slice of one precomputed line.
+    """
+    base = rng.randrange(256)
+    row_bytes = width * 3
+    line = bytes((base + x) & 0xFF for x in range(2 * row_bytes))
+    return [line[(y * 3) % row_bytes:][:row_bytes] for y in range(height)]
+
+def _png(width: int, height: int, rng: random.Random) -> bytes:
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    raw = b''.join(b'\0' + row for row in _pixel_rows(width, height, rng))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 1)) + chunk(b'IEND', b''))
+
+def _bmp(width: int, height: int, rng: random.Random) -> bytes:
+    row_size = (width * 3 + 3) & ~3
+    rows = b''.join(row.ljust(row_size, b'\0') for row in _pixel_rows(width, height, rng))
+    header = struct.pack('<2sIHHI', b'BM', 54 + len(rows), 0, 0, 54)
+    info = struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, len(rows), 2835, 2835, 0, 0)
+    return header + info + rows
+
+def _tiff(width: int, height: int, rng: random.Random) -> bytes:
+    pixels = b''.join(_pixel_rows(width, height, rng))
+    entries = [
+        (256, 4, 1, width), (257, 4, 1, height), (258, 3, 1, 8), (259, 3, 1, 1),
+        (262, 3, 1, 2), (273, 4, 1, 0), (277, 3, 1, 3), (278, 4, 1, height), (279, 4, 1, len(pixels)),
+    ]
+    ifd_size = 2 + len(entries) * 12 + 4
+    pixel_offset = 8 + ifd_size
+    ifd = struct.pack('<H', len(entries))
+    for tag, kind, count, value in entries:
+        if tag == 273:
+            value = pixel_offset
+        if kind == 3:
+            ifd += struct.pack('<HHIHH', tag, kind, count, value, 0)
+        else:
+            ifd += struct.pack('<HHII', tag, kind, count, value)
+    return b'II' + struct.pack('<HI', 42, 8) + ifd + struct.pack('<I', 0) + pixels
+
+def _jpeg(width: int, height: int, size: int) -> bytes:
+    # APP1 padding stands in for EXIF and scan data, so the frame header sits after a segment to skip
+    padding = max(0, min(size, 0xFFFF - 2))
+    data = b'\xff\xd8\xff\xe1' + struct.pack('>H', padding + 2) + b'\0' * padding
+    data += b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, height, width, 3) + b'\x01\x11\x00\x02\x11\x00\x03\x11\x00'
+    return data + b'\xff\xd9'
+
+def _gif(width: int, height: int, size: int) -> bytes:
+    return b'GIF89a' + struct.pack('<HH', width, height) + b'\0' * max(20, size)
+
+def _webp(width: int, height: int, size: int) -> bytes:
+    body = b'VP8X' + struct.pack('<I', 10) + b'\0' * 4 + (width - 1).to_bytes(3, 'little') + (height - 1).to_bytes(3, 'little')
+    body += b'JUNK' + struct.pack('<I', size) + b'\0' * size
+    return b'RIFF' + struct.pack('<I', 4 + len(body)) + b'WEBP' + body
+
+def _image_bytes(kind: str, rng: random.Random) -> bytes:
+    if kind in ('png', 'bmp', 'tiff'):
+        width, height = rng.randint(16, MAX_DECODABLE_EDGE), rng.randint(16, MAX_DECODABLE_EDGE)
+        return {'png': _png, 'bmp': _bmp, 'tiff': _tiff}[kind](width, height, rng)
+    width, height = rng.randint(640, 8000), rng.randint(480, 6000)
+    size = rng.randint(2_000, 60_000)
+    return {'jpg': _jpeg, 'gif': _gif, 'webp': _webp}[kind](width, height, size)
+
+def generate(output: str, images: int = 10000, tags: int = 50, density: float = 0.05, seed: int = 0) -> Dict:
+    """
+    Write the library and return its manifest: parameters, files, and planned tags
+    as {tag name: [indexes into files]}.
+    """
+    rng = random.Random(seed)
+    kinds = [kind for kind, _ in FORMATS]
+    weights = [share for _, share in FORMATS]
+    files: List[str] = []
+    for index in range(images):
+        kind = rng.choices(kinds, weights)[0]
+        folder = os.path.join(output, f"{index // FILES_PER_FOLDER:05d}")
+        if index % FILES_PER_FOLDER == 0:
+            os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"img{index:07d}.{kind}")
+        with open(path, 'wb') as f:
+            f.write(_image_bytes(kind, rng))
+        os.utime(path, (FIXED_MTIME, FIXED_MTIME))
+        files.append(os.path.relpath(path, output))
+
+    planned = {f"tag{tag:03d}": [index for index in range(images) if rng.random() < density]
+               for tag in range(tags)}
+    manifest = {"images": images, "tags": tags, "density": density, "seed": seed,
+                "files": files, "planned_tags": planned}
+    with open(os.path.join(output, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return manifest
+
+def load_manifest(output: str) -> Dict:
+    with open(os.path.join(output, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('output')
+    parser.add_argument('--images', type=int, default=10000)
+    parser.add_argument('--tags', type=int, default=50)
+    parser.add_argument('--density', type=float, default=0.05, help="chance of each tag on each image")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.output, args.images, args.tags, args.density, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Command-line batch mode: ingest, tagging, querying and export without the GUI.
+
+Every subcommand writes one JSON object per line to stdout. Only the
+"thumbnails" subcommand loads Qt (QtGui image decoding, no windows), so the
+others run on machines without PyQt5 or a display, e.g. from cron.
+
+Examples:
+    python cli.py import ~/Pictures --recursive --workers 16 --hash
+    python cli.py tag holiday --query "beach OR sea"
+    python cli.py query "cat AND NOT dog"
+    python cli.py export --output library.jsonl
+    python cli.py thumbnails --workers 8
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from database import DEFAULT_EXTENSIONS, DatabaseManager
+from tag_index import TagIndex, TagQueryError
+
+# Images handed to the thumbnail workers at a time
+THUMBNAIL_BATCH_SIZE = 256
+
+def emit(record: dict, out=sys.stdout) -> None:
+    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    out.flush()
+
+def image_record(image) -> dict:
+    return {"id": image.id, "filepath": image.filepath, "width": image.width,
+            "height": image.height, "tags": image.tags}
+
+def _select_ids(db: DatabaseManager, query: Optional[str], ids: Optional[List[int]],
+                under: Optional[str]) -> List[int]:
+    """
+    Resolve the target images of a command: a tag query, explicit ids and/or a folder prefix.
+    With several criteria an image must satisfy all of them.
+    """
+    catalog = db.get_image_catalog()
+    selected = list(catalog.ids)
+    if query is not None:
+        index = TagIndex.from_catalog(catalog, db.get_all_tags())
+        selected = index.query_ids(query)
+    if ids:
+        wanted = set(ids)
+        selected = [image_id for image_id in selected if image_id in wanted]
+    if under:
+        prefix = os.path.join(os.path.abspath(under), '')
+        selected = [image_id for image_id in selected
+                    if catalog.filepath(catalog.row_of(image_id)).startswith(prefix)]
+    return selected
+
+def cmd_ingest(db: DatabaseManager, args) -> int:
+    sync = db.rescan_folder if args.command == 'rescan' else db.add_folder
+    for folder in args.folders:
+        folder = os.path.abspath(folder)
+        report = sync(folder, extensions=args.ext or DEFAULT_EXTENSIONS, recursive=args.recursive,
+                      include=args.include, exclude=args.exclude, max_depth=args.max_depth,
+                      hash_contents=args.hash)
+        emit({"event": args.command, "folder": folder, "added": report.added, "skipped": report.skipped,
+              "failed": report.failed, "updated": report.updated, "removed": report.removed,
+              "hashed": report.hashed, "elapsed": round(report.elapsed, 3)})
+    return 0
+
+def cmd_tag(db: DatabaseManager, args) -> int:
+    if args.query is None and not args.id and not args.under:
+        print("tag: give --query, --id or --under to choose images", file=sys.stderr)
+        return 2
+    image_ids = _select_ids(db, args.query, args.id, args.under)
+    tag = db.get_or_create_tag(args.tag)
+    value = not args.remove
+    if not db.set_tag_for_images(image_ids, tag.id, value):
+        return 1
+    emit({"event": "tag", "tag": tag.name, "tag_id": tag.id, "value": value, "images": len(image_ids)})
+    return 0
+
+def cmd_query(db: DatabaseManager, args) -> int:
+    if args.query:
+        catalog = db.get_image_catalog()
+        index = TagIndex.from_catalog(catalog, db.get_all_tags())
+        images: Iterable = (catalog[catalog.row_of(image_id)] for image_id in index.query_ids(args.query))
+    else:
+        # Read a page at a time, so exporting a large library never holds all of it
+        images = (image for page in db.iter_image_catalog() for image in page)
+    out = open(args.output, 'w', encoding='utf-8') if getattr(args, 'output', None) else sys.stdout
+    try:
+        for image in images:
+            emit(image_record(image), out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+def cmd_duplicates(db: DatabaseManager, args) -> int:
+    if args.hash:
+        db.update_content_hashes()
+    for group in db.find_duplicates():
+        emit({"event": "duplicates", "images": [image_record(image) for image in group]})
+    if args.merge_tags:
+        emit({"event": "merge_tags", "added": db.merge_duplicate_tags()})
+    return 0
+
+def cmd_thumbnails(db: DatabaseManager, args) -> int:
+    # Qt is only needed here, for decoding; no QApplication or display is used
+    from thumbnail_cache import ThumbnailCache, cache_path_for
+    from thumbnailer import THUMBNAIL_SIZE, thumbnail_hash
+
+    cache = ThumbnailCache(cache_path_for(args.db))
+    catalog = db.get_image_catalog()
+    known = dict(db.get_perceptual_hashes())
+    made = failed = 0
+
+    def work(row):
+        return thumbnail_hash(catalog.filepath(row), THUMBNAIL_SIZE, cache)
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            for start in range(0, len(catalog), THUMBNAIL_BATCH_SIZE):
+                rows = range(start, min(start + THUMBNAIL_BATCH_SIZE, len(catalog)))
+                hashes = []
+                for row, phash in zip(rows, executor.map(work, rows)):
+                    if phash is None:
+                        failed += 1
+                        continue
+                    made += 1
+                    if known.get(catalog.ids[row]) != phash:
+                        hashes.append((catalog.ids[row], phash))
+                db.set_perceptual_hashes(hashes)
+                cache.flush()
+                emit({"event": "thumbnails", "done": rows.stop, "total": len(catalog)})
+    finally:
+        cache.close()
+    emit({"event": "thumbnails_done", "made": made, "failed": failed,
+          "cache_hits": cache.hits, "cache_misses": cache.misses})
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="tg-image-tagger batch mode (JSONL output)")
+    parser.add_argument('--db', default='image_tags.db', help="database file (default: image_tags.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('import', "add image files from folders"),
+                            ('rescan', "sync folders: add new, re-probe changed, drop missing files")):
+        ingest = commands.add_parser(name, help=help_text)
+        ingest.add_argument('folders', nargs='+')
+        ingest.add_argument('--recursive', '-r', action='store_true')
+        ingest.add_argument('--workers', type=int, help="threads probing image headers")
+        ingest.add_argument('--ext', action='append', help="file extension, repeatable (default: common image types)")
+        ingest.add_argument('--include', action='append', help="file name glob to ingest, repeatable")
+        ingest.add_argument('--exclude', action='append', help="file or folder name glob to skip, repeatable")
+        ingest.add_argument('--max-depth', type=int)
+        ingest.add_argument('--hash', action='store_true', help="hash same-size files for duplicate detection")
+        ingest.set_defaults(handler=cmd_ingest)
+
+    tag = commands.add_parser('tag', help="add or remove a tag on many images at once")
+    tag.add_argument('tag', help="tag name; created if missing")
+    tag.add_argument('--query', help="tag query selecting the images")
+    tag.add_argument('--id', type=int, action='append', help="image id, repeatable")
+    tag.add_argument('--under', help="only images inside this folder")
+    tag.add_argument('--remove', action='store_true')
+    tag.set_defaults(handler=cmd_tag)
+
+    query = commands.add_parser('query', help="list images matching a tag query")
+    query.add_argument('query', nargs='?', default='')
+    query.set_defaults(handler=cmd_query, read_only=True)
+
+    export = commands.add_parser('export', help="write every image (or a query's result) with its tags")
+    export.add_argument('--query', default='')
+    export.add_argument('--output', '-o', help="output file (default: stdout)")
+    export.set_defaults(handler=cmd_query, read_only=True)
+
+    duplicates = commands.add_parser('duplicates', help="list images with identical content")
+    duplicates.add_argument('--hash', action='store_true', help="hash same-size images without a hash first")
+    duplicates.add_argument('--merge-tags', action='store_true', help="give duplicates the union of their tags")
+    duplicates.set_defaults(handler=cmd_duplicates)
+
+    thumbnails = commands.add_parser('thumbnails', help="pre-build the thumbnail cache and perceptual hashes (needs PyQt5)")
+    thumbnails.add_argument('--workers', type=int)
+    thumbnails.set_defaults(handler=cmd_thumbnails)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        # Read-only commands open an existing file only, so a mistyped --db is an error
+        db = DatabaseManager(args.db, probe_workers=getattr(args, 'workers', None),
+                             read_only=getattr(args, 'read_only', False))
+    except sqlite3.Error as e:
+        print(f"Cannot open database {args.db}: {e}", file=sys.stderr)
+        return 2
+    try:
+        return args.handler(db, args)
+    except TagQueryError as e:
+        print(f"Invalid tag query: {e}", file=sys.stderr)
+        return 2
+    except BrokenPipeError:
+        # The reader stopped early (e.g. `cli.py query | head`); point stdout at devnull
+        # so the interpreter's final flush does not fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        db.conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
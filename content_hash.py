@@ -0,0 +1,24 @@
+import hashlib
+from typing import Optional
+
+# Bytes read per step; the same buffer is reused, so memory stays flat for any file size
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> Optional[str]:
+    """
+    Return the hex BLAKE2b digest of a file's contents, or None if it cannot be read.
+    The file is streamed through one fixed-size buffer with readinto().
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    try:
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                digest.update(view[:count])
+    except OSError:
+        return None
+    return digest.hexdigest()
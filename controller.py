@@ -1,39 +1,215 @@
-from PyQt5.QtCore import QSettings, QItemSelectionModel
+from collections import deque
+
+from PyQt5.QtCore import QSettings, QItemSelectionModel, QTimer
+
+import instrumentation
+from image_catalog import CatalogRows, ImageCatalog
+from image_prefetcher import DEFAULT_PREFETCH_COUNT
+from perceptual_hash import DEFAULT_SIMILAR_DISTANCE, PerceptualHashIndex
+from qt_async import FutureWatcher
+from tag_index import TagIndex
+from tag_queue import TagWriteQueue
+
+# How long tag edits are buffered before they are written to the database
+TAG_FLUSH_INTERVAL_MS = 2000
+# Images read before the grid is first shown (more than a screenful), then per background page
+FIRST_PAGE_SIZE = 500
+PAGE_SIZE = 20000
 
 class AppController:
 
-    def __init__(self, image_grid, detail_panel, database_manager, settings):
+    def __init__(self, image_grid, detail_panel, database_manager, settings, prefetcher=None, async_db=None,
+                 folder_watcher=None, startup_timer=None):
         """
         Initialize the AppController.
 
         Loads the database path, known tags, and previously opened folders.
-        If folders are found, it retrieves all images from the database, otherwise it leaves the image list empty.
-     
+        Images are not loaded here: run() shows the first page at once and streams
+        the rest in, so the window does not wait for the whole library.
+        startup_timer (an instrumentation.PhaseTimer) gets a mark for each loading stage.
         """
         # References to UI components and helpers
         self.image_grid = image_grid
         self.detail_panel = detail_panel
         self.db_manager = database_manager
         self.settings = settings
-
+        # Writer thread and reader pool for database work off the GUI thread (optional)
+        self.async_db = async_db
+        self.watcher = FutureWatcher()
+        # Background decoder for neighbors of the selected image (optional)
+        self.prefetcher = prefetcher
+        self.prefetch_count = int(self.settings.value('prefetch_count', DEFAULT_PREFETCH_COUNT))
+        # Reports files changed in registered folders, so they are ingested without a rescan (optional)
+        self.folder_watcher = folder_watcher
+        # Hash same-size files during ingest so duplicates can be found
+        self.hash_contents = self.settings.value('hash_contents', False, type=bool)
+        # Largest Hamming distance between perceptual hashes shown by "Find Similar"
+        self.similar_distance = int(self.settings.value('similar_distance', DEFAULT_SIMILAR_DISTANCE))
 
         
         # Path to the image tags database file
         self.db_path = "image_tags.db"
         
+        # Loaded images and the inverted tag index for filtering; filled when images are loaded
+        self.images = ImageCatalog()
+        self.tag_index = TagIndex()
+        # Perceptual hashes for near-duplicate search; more are added as thumbnails are made
+        self.similar_index = PerceptualHashIndex()
+
         # Load all known tags from the database
-        self.all_tags = self.db_manager.get_all_tags()
+        self.refresh_tags()
+
+        # Tag edits are applied in memory at once and written to the database in batches
+        self.tag_queue = TagWriteQueue()
+        self.tag_flush_timer = QTimer()
+        self.tag_flush_timer.setSingleShot(True)
+        self.tag_flush_timer.setInterval(TAG_FLUSH_INTERVAL_MS)
+        self.tag_flush_timer.timeout.connect(self.flush_tag_changes)
         
+        # Perceptual hashes computed since the last write, stored in batches like tag edits
+        self.pending_hashes = []
+        self.hash_flush_timer = QTimer()
+        self.hash_flush_timer.setSingleShot(True)
+        self.hash_flush_timer.setInterval(TAG_FLUSH_INTERVAL_MS)
+        self.hash_flush_timer.timeout.connect(self.flush_perceptual_hashes)
+
+        # Tag query shown in the grid; empty shows every image
+        self.filter_query = ""
+        # Image ids found by "Find Similar", nearest first; shown instead of the filter when set
+        self.similar_ids = None
+
         # Load list of folders from application settings
         self.folders = self.load_folders_from_settings()
-        
-        # Load images from database only if folders exist (skip on first run)
-        if self.folders:
-            # Retrieve all images (or filter by tags if needed)
-            self.images = self.db_manager.get_all_images()
+        self.startup_timer = startup_timer
+        # Called once the library is loaded and the folders are rescanned (e.g. to report startup time)
+        self.on_startup_done = None
+        # While pages are still loading, ingest results wait here (see apply_ingest_report)
+        self._loading = False
+        self._pending_reports = []
+        self._pending_tag_links = []
+        # Ingest reports being applied, oldest first (see apply_ingest_report)
+        self._report_queue = deque()
+        self._set_image_list(ImageCatalog(self.all_tags))
+
+    def _set_image_list(self, images):
+        # ImageCatalog of all loaded images; rows are found by id with catalog.row_of
+        self.images = images
+        self.images.set_tag_names(self.all_tags)
+        # Inverted tag index for filtering, built from the tag ids already in the catalog
+        self.tag_index = TagIndex.from_catalog(images, self.all_tags)
+
+    def _mark(self, phase):
+        if self.startup_timer is not None:
+            self.startup_timer.mark(phase)
+
+    def load_library(self):
+        """
+        Staged load: the first FIRST_PAGE_SIZE images are read and shown at once,
+        the rest arrive in PAGE_SIZE pages (on the reader pool with async_db,
+        otherwise one page per event loop pass) and are appended to the grid.
+        Afterwards the perceptual hashes are loaded and the folders are
+        rescanned in the background.
+        """
+        self._loading = True
+        # Images are loaded even with no registered folders (e.g. a database filled by cli.py)
+        first = self.db_manager.get_image_catalog(limit=FIRST_PAGE_SIZE)
+        self.set_images(first)
+        self._mark("first_page")
+        if len(first) < FIRST_PAGE_SIZE:
+            self._finish_loading()
+        else:
+            self._load_page(first.ids[-1])
+
+    def _load_page(self, after_id):
+        if self.async_db is None:
+            QTimer.singleShot(0, lambda: self._on_page(self.db_manager.get_image_catalog(after_id, limit=PAGE_SIZE)))
+        else:
+            self.watcher.watch(self.async_db.get_image_catalog(after_id, limit=PAGE_SIZE), self._on_page)
+
+    def _on_page(self, page):
+        self.append_images(page)
+        if len(page) < PAGE_SIZE:
+            self._finish_loading()
+        else:
+            self._load_page(page.ids[-1])
+
+    def _finish_loading(self):
+        self._mark("library_loaded")
+        self._loading = False
+        reports, self._pending_reports = self._pending_reports, []
+        for report in reports:
+            self.apply_ingest_report(report)
+        links, self._pending_tag_links = self._pending_tag_links, []
+        self.apply_tag_links(links)
+        self._load_perceptual_hashes()
+        if self.folder_watcher is not None:
+            for folder in self.folders:
+                self.folder_watcher.watch(folder)
+        # Pick up files added, changed or deleted on disk since the last run
+        self.rescan_folders(self._startup_done)
+
+    def _startup_done(self):
+        self._mark("rescan_done")
+        if self.on_startup_done:
+            self.on_startup_done()
+
+    def _load_perceptual_hashes(self):
+        def loaded(pairs):
+            for image_id, value in pairs:
+                # Hashes made by thumbnails meanwhile are newer
+                if image_id not in self.similar_index:
+                    self.similar_index.add(image_id, value)
+
+        if self.async_db is None:
+            loaded(self.db_manager.get_perceptual_hashes())
         else:
-            # No folders saved; first run with no images loaded
-            self.images = []
+            self.watcher.watch(self.async_db.get_perceptual_hashes(), loaded)
+
+    @instrumentation.user_action("load_images")
+    def set_images(self, images):
+        """
+        Replace the loaded ImageCatalog and show it in the grid (with the current filter).
+        Pending tag edits must be flushed first, as the catalog comes from the database.
+        """
+        self._set_image_list(images)
+        self.image_grid.set_images(self.filtered_images())
+
+    @instrumentation.user_action("filter")
+    def apply_filter(self, query):
+        """
+        Show only images matching a tag query (see TagIndex); an empty query shows all.
+        Raises TagQueryError for a malformed query and keeps the current filter.
+        """
+        query = query.strip()
+        if query:
+            # Validate before switching
+            self.tag_index.query(query)
+        self.filter_query = query
+        self.similar_ids = None
+        self.image_grid.set_images(self.filtered_images())
+
+    def filtered_images(self):
+        """
+        Return the loaded images matching the current filter, in load order,
+        or the results of the last "Find Similar", nearest first.
+        A filter result is CatalogRows taken straight from the tag bitmaps,
+        so no per-image objects are made however many images match.
+        """
+        if self.similar_ids is not None:
+            rows = (self.images.row_of(image_id) for image_id in self.similar_ids)
+            return CatalogRows(self.images, [row for row in rows if row is not None], ascending=False)
+        if not self.filter_query:
+            return self.images
+        return CatalogRows(self.images, self.tag_index.query_rows(self.filter_query))
+
+    def refresh_tags(self):
+        """
+        Reload the known tags, e.g. after a new tag has been created.
+        """
+        self.all_tags = self.db_manager.get_all_tags()
+        self.tag_names = {tag.id: tag.name for tag in self.all_tags}
+        self.tag_index.set_tags(self.all_tags)
+        self.images.set_tag_names(self.all_tags)
 
     def load_folders_from_settings(self):
         """
@@ -52,6 +228,38 @@ class AppController:
             folders = [folders]
         return folders
 
+    def rescan_folders(self, on_done=None):
+        """
+        Sync every registered folder with the database and apply the changes to the
+        loaded images. Only new or changed files are probed; missing files are
+        removed in bulk. With async_db the scans run on the writer thread.
+        on_done() is called after the last folder.
+        """
+        if self.async_db is None:
+            for folder in self.folders:
+                self.apply_ingest_report(self.db_manager.rescan_folder(folder, hash_contents=self.hash_contents))
+            if on_done:
+                on_done()
+            return
+        pending = [len(self.folders)]
+
+        def scanned(report=None):
+            if report is not None:
+                self.apply_ingest_report(report)
+            pending[0] -= 1
+            if not pending[0] and on_done:
+                on_done()
+
+        def failed(error):
+            print(f"Error rescanning folder: {error}")
+            scanned()
+
+        if not self.folders and on_done:
+            on_done()
+        for folder in self.folders:
+            future = self.async_db.rescan_folder(folder, hash_contents=self.hash_contents)
+            self.watcher.watch(future, scanned, failed)
+
     def save_folders_to_settings(self):
         """
         Save the current list of folder paths to application settings using QSettings.
@@ -60,6 +268,7 @@ class AppController:
         self.settings.setValue('folders', self.folders)
 
 #TODO potential async
+    @instrumentation.user_action("select_image")
     def on_image_selected(self, list):
 
         # If nothing is selected, do nothing
@@ -69,70 +278,381 @@ class AppController:
         image = list[0]
         
         if image:
-            self.detail_panel.set_image(image)
+            self.detail_panel.set_image(image, list)
+            self.prefetch_neighbors()
 
-#TODO #TODO #TODO - ADAPT FOR IMAGE GIRD DDDDDDD
+    @instrumentation.user_action("toggle_tag")
     def handle_tag_changed(self, image_id, tag_id, value):
         """
         Handler for when a tag is changed on an image.
-        Updates the database and refreshes the detail panel.
+        Updates the in-memory image and grid at once and queues the database write.
 
         Parameters:
         - image_id: Identifier of the image being tagged.
         - tag_id: Identifier of the tag being changed.
         - value: The new value/state of the tag (e.g. True/False).
         """
-        # Update the tag in the database for the given image
-        if value:
-            self.db_manager.set_tag(image_id, tag_id, True)
-        else: 
-            self.db_manager.set_tag(image_id, tag_id, False)
-        
-        # Reload the updated image data from the database (to get new tag values)
-        updated_image = self.db_manager.get_image(image_id)
+        self._apply_tags([image_id], tag_id, value)
 
-        # Обновим DetailPanel сразу (если хотим показать новые теги)
-        #self.detail_panel.set_image(updated_image)
+    @instrumentation.user_action("toggle_tag_bulk")
+    def handle_tag_changed_for_images(self, image_ids, tag_id, value):
+        """
+        Handler for a tag toggled on a multi-selection.
+        All changes go through the same write-behind queue and reach the
+        database together in one transaction on the next flush.
+        """
+        self._apply_tags(image_ids, tag_id, value)
 
-        # Найдём его в списке controller.images и заменим
-        for idx,img in enumerate(self.images):
-            if img.id == image_id:
-                self.images[idx] = updated_image
-                #self.image_grid.update_image(img)
-                self.image_grid.update_image(img)
-                break
+    def _apply_tags(self, image_ids, tag_id, value):
+        # The catalog rows change in one pass; the index takes one bitmap for all images
+        images = self.images
+        known_tag = tag_id in self.tag_names
+        changed = []
+        for image_id in image_ids:
+            row = images.row_of(image_id)
+            if row is None or not known_tag:
+                self.tag_queue.record(image_id, tag_id, value)
+                continue
+            self.tag_queue.record(image_id, tag_id, value, images.has_tag(row, tag_id))
+            if images.set_tag(row, tag_id, value):
+                changed.append(image_id)
+        self.tag_index.set_tag_for_images(image_ids, tag_id, value)
+        # Views read the catalog, so the grid and panel only need a repaint
+        self.image_grid.update_images(changed)
 
+        if self.tag_queue and not self.tag_flush_timer.isActive():
+            self.tag_flush_timer.start()
+
+    @instrumentation.timed("controller.flush_tag_changes")
+    def flush_tag_changes(self):
+        """
+        Write buffered tag edits to the database in one transaction.
+        Called by the flush timer, before reloading images, and on exit.
+        With async_db the write runs on the database writer thread.
+        """
+        self.tag_flush_timer.stop()
+        if not self.tag_queue:
+            return
+        if self.async_db is None:
+            if not self.tag_queue.flush(self.db_manager):
+                # Keep the edits and try again later
+                self.tag_flush_timer.start()
+            return
+        taken = self.tag_queue.take()
+        future = self.async_db.apply_tag_changes([change[:3] for change in taken])
+        self.watcher.watch(
+            future,
+            lambda ok: ok or self._restore_tag_changes(taken),
+            lambda error: self._restore_tag_changes(taken)
+        )
+
+    def _restore_tag_changes(self, taken):
+        # The write failed; requeue what newer edits have not superseded and retry later
+        self.tag_queue.restore(taken)
+        self.tag_flush_timer.start()
+
+    @instrumentation.user_action("add_folder")
+    def add_folder(self, folder):
+        """
+        Register a folder and ingest its images.
+        Only the newly inserted rows are loaded and appended to the grid;
+        images already shown keep their rows and thumbnails.
+        With async_db ingest and loading run off the GUI thread.
+        """
+        self.folders.append(folder)
+        self.save_folders_to_settings()
+        if self.folder_watcher is not None:
+            self.folder_watcher.watch(folder)
+        if self.async_db is None:
+            self.apply_ingest_report(self.db_manager.add_folder(folder, hash_contents=self.hash_contents))
+            return
+        future = self.async_db.add_folder(folder, hash_contents=self.hash_contents)
+        self.watcher.watch(future, self.apply_ingest_report)
+
+    @instrumentation.user_action("sync_changes")
+    def sync_changes(self, paths, folders):
+        """
+        Ingest the changes a FolderWatcher reported: only the given file paths are
+        looked up and probed, and only the given folders are re-scanned (when the
+        watcher could not tell which of their files changed).
+        """
+        if self.async_db is None:
+            if paths:
+                self.apply_ingest_report(self.db_manager.sync_paths(paths, hash_contents=self.hash_contents))
+            for folder in folders:
+                self.apply_ingest_report(self.db_manager.rescan_folder(folder, hash_contents=self.hash_contents))
+            return
+        futures = [self.async_db.rescan_folder(folder, hash_contents=self.hash_contents) for folder in folders]
+        if paths:
+            futures.append(self.async_db.sync_paths(paths, hash_contents=self.hash_contents))
+        for future in futures:
+            self.watcher.watch(future, self.apply_ingest_report)
+
+    def apply_ingest_report(self, report):
+        """
+        Bring the loaded images and the grid in line with an ingest:
+        removed images are dropped, re-probed ones reloaded, and new ones appended.
+        Until the library is loaded, reports are kept and applied afterwards: pages
+        still to come hold lower ids than the new rows, and the catalog only
+        accepts ascending ids.
+        """
+        if self._loading:
+            self._pending_reports.append(report)
+            return
+        # One report at a time, each after the catalog reads of the one before:
+        # reads finishing out of order would append ids below the last one, or
+        # bring back images a later report removed
+        self._report_queue.append(report)
+        if len(self._report_queue) == 1:
+            self._apply_next_report()
+
+    def _apply_next_report(self):
+        report = self._report_queue[0]
+        if report.removed_ids:
+            self.remove_images(report.removed_ids)
+        loads = []
+        if report.updated_ids:
+            loads.append((self.update_images, {'image_ids': report.updated_ids}))
+        if report.added_ids:
+            # New ids are ascending, so they are read with a range scan
+            loads.append((self.append_images, {'after_id': report.added_ids[0] - 1}))
+        self._run_report_loads(loads)
+
+    def _run_report_loads(self, loads):
+        if not loads:
+            self._report_queue.popleft()
+            if self._report_queue:
+                self._apply_next_report()
+            return
+        (on_loaded, query), rest = loads[0], loads[1:]
+
+        def loaded(catalog):
+            on_loaded(catalog)
+            self._run_report_loads(rest)
+
+        def failed(error):
+            print(f"Error loading ingested images: {error}")
+            self._run_report_loads(rest)
+
+        if self.async_db is None:
+            loaded(self.db_manager.get_image_catalog(**query))
+        else:
+            self.watcher.watch(self.async_db.get_image_catalog(**query), loaded, failed)
+
+    @instrumentation.user_action("append_images")
+    def append_images(self, catalog):
+        """
+        Merge an ImageCatalog of newly ingested images into the loaded ones
+        and append those matching the current filter to the grid.
+        Costs time proportional to the new images, not to the library.
+        """
+        rows = self.images.extend(catalog)
+        if not rows:
+            return
+        new_ids = [self.images.ids[row] for row in rows]
+        self.tag_index.add_catalog(self.images, rows)
+        if self.similar_ids is not None:
+            # The grid lists "Find Similar" results; new images show up once it returns to the filter
+            return
+        if self.filter_query:
+            rows = [self.images.row_of(image_id)
+                    for image_id in self.tag_index.query_ids(self.filter_query, new_ids)]
+        self.image_grid.append_images(CatalogRows(self.images, rows))
+
+    @instrumentation.user_action("remove_images")
+    def remove_images(self, image_ids):
+        """
+        Drop images deleted from disk from the loaded catalog, the indexes and the grid.
+        Catalog rows move up, so the grid's list is rebuilt; loaded icons are kept.
+        """
+        # Read while the grid's rows still match the catalog
+        current_id = self.image_grid.current_image_id()
+        if not self.images.remove(image_ids):
+            return
+        removed = set(image_ids)
+        self.tag_index.remove_images(removed)
+        for image_id in removed:
+            self.similar_index.remove(image_id)
+        # Their rows are gone, so queued edits could never be written
+        self.tag_queue.discard_images(removed)
+        if self.similar_ids is not None:
+            self.similar_ids = [image_id for image_id in self.similar_ids if image_id not in removed]
+        self.detail_panel.forget_images(removed)
+        self.image_grid.reload_images(self.filtered_images(), current_id)
+
+    def update_images(self, catalog):
+        """
+        Take new sizes from an ImageCatalog of re-probed images and re-create their thumbnails.
+        """
+        changed = []
+        for row in range(len(catalog)):
+            image_id = catalog.ids[row]
+            own_row = self.images.row_of(image_id)
+            if own_row is None:
+                continue
+            self.images.set_size(own_row, catalog.widths[row], catalog.heights[row])
+            # Old content, so the old hash no longer applies; a new one comes with the thumbnail
+            self.similar_index.remove(image_id)
+            changed.append(image_id)
+        self.image_grid.refresh_images(changed)
+
+    @instrumentation.user_action("merge_duplicates")
+    def merge_duplicate_tags(self, on_done=None, on_error=None):
+        """
+        Hash same-size images not hashed yet, then give every duplicate the union of
+        its group's tags. Only the added links are applied to the loaded images;
+        tag edits made meanwhile are kept.
+        on_done(added) receives the number of tag links added; on_error(exception)
+        is called if hashing or merging fails, and then nothing is merged.
+        """
+        # Queued edits are written first, so they take part in the merge
+        self.flush_tag_changes()
+
+        def merged(links):
+            self.apply_tag_links(links)
+            if on_done:
+                on_done(len(links))
+
+        if self.async_db is None:
+            try:
+                self.db_manager.update_content_hashes()
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+                return
+            merged(self.db_manager.merge_duplicate_tag_links())
+            return
+        # The writer runs the hashing after the flush above; the merge waits for it to succeed
+        self.watcher.watch(
+            self.async_db.update_content_hashes(),
+            lambda hashed: self.watcher.watch(self.async_db.merge_duplicate_tag_links(), merged, on_error),
+            on_error
+        )
+
+    def apply_tag_links(self, links):
+        """
+        Add (image_id, tag_id) links already stored in the database to the loaded images.
+        Links with a queued edit are skipped: the edit is newer and is written on the
+        next flush. While pages are still loading, links wait like ingest reports.
+        """
+        if self._loading:
+            self._pending_tag_links.extend(links)
+            return
+        changed = set()
+        per_tag = {}
+        for image_id, tag_id in links:
+            if (image_id, tag_id) in self.tag_queue:
+                continue
+            per_tag.setdefault(tag_id, []).append(image_id)
+            row = self.images.row_of(image_id)
+            if row is not None and tag_id in self.tag_names and self.images.set_tag(row, tag_id, True):
+                changed.add(image_id)
+        for tag_id, image_ids in per_tag.items():
+            self.tag_index.set_tag_for_images(image_ids, tag_id, True)
+        if changed:
+            self.image_grid.update_images(changed)
+            self.detail_panel.refresh_tags()
+
+    def on_perceptual_hash(self, image_id, phash):
+        """
+        Record the perceptual hash of a freshly made thumbnail and queue it for storage.
+        """
+        if self.similar_index.get(image_id) == phash:
+            return
+        self.similar_index.add(image_id, phash)
+        self.pending_hashes.append((image_id, phash))
+        if not self.hash_flush_timer.isActive():
+            self.hash_flush_timer.start()
+
+    def flush_perceptual_hashes(self):
+        """
+        Store queued perceptual hashes in one transaction.
+        """
+        self.hash_flush_timer.stop()
+        if not self.pending_hashes:
+            return
+        hashes, self.pending_hashes = self.pending_hashes, []
+        if self.async_db is None:
+            self.db_manager.set_perceptual_hashes(hashes)
+        else:
+            self.async_db.set_perceptual_hashes(hashes)
+
+    @instrumentation.user_action("find_similar")
+    def find_similar(self, image_id, on_done=None):
+        """
+        Show the images whose perceptual hash is within similar_distance of the given
+        image, nearest first; applying a tag filter returns to the normal view.
+        Only images that already have a hash (made with their thumbnail) are found.
+        An image not thumbnailed yet is hashed on a worker thread first.
+        on_done(found) receives the number of other images found.
+        """
+        phash = self.similar_index.get(image_id)
+        row = self.images.row_of(image_id)
+        if phash is None and row is not None:
+            future = self.image_grid.thumbnailer.hash_file(self.images.filepath(row))
+            self.watcher.watch(future, lambda phash: self._show_similar(image_id, phash, on_done),
+                               lambda error: self._show_similar(image_id, None, on_done))
+            return
+        self._show_similar(image_id, phash, on_done)
+
+    def _show_similar(self, image_id, phash, on_done):
+        found = 0
+        if phash is not None:
+            self.on_perceptual_hash(image_id, phash)
+            matches = self.similar_index.search(phash, self.similar_distance)
+            self.similar_ids = [match_id for _, match_id in matches]
+            self.image_grid.set_images(self.filtered_images())
+            found = len(self.similar_ids) - 1
+        if on_done:
+            on_done(found)
+
+    def add_tag(self, name, on_error=None):
+        """
+        Create a tag and refresh the tag buttons.
+        on_error(exception) is called if the tag cannot be created.
+        """
+        def on_created(tag):
+            self.refresh_tags()
+            self.detail_panel.set_tags_available(self.all_tags)
+
+        if self.async_db is None:
+            try:
+                on_created(self.db_manager.get_or_create_tag(name))
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+            return
+        self.watcher.watch(self.async_db.get_or_create_tag(name), on_created, on_error)
 
     def select_previous_image(self):
-        pass
-    # def select_previous_image(self):
-    #     idx_list = self.image_grid.list
-    #     if not idx_list: 
-    #         return
-    #     current = idx_list[0]
-    #     //prev = self.image_table.model().index(current.row() , current.column()- 1)
-    #     if prev.isValid():
-    #         self.image_table.selectionModel().select(prev, QItemSelectionModel.ClearAndSelect)
-    #         self.on_image_selected(self.image_table.selectionModel().selection(), None)
+        """
+        Move the selection to the image before the current one.
+        """
+        self.image_grid.select_row(self.image_grid.current_row() - 1)
 
     def select_next_image(self):
-        pass
-    # def select_next_image(self):
-    #     idx_list = self.image_
-    #     if not idx_list: 
-    #         return
-    #     current = idx_list[0]
-    #     nxt = self.image_table.model().index(current.row() , current.column()+ 1)
-    #     if nxt.isValid():
-    #         self.image_table.selectionModel().select(nxt, QItemSelectionModel.ClearAndSelect)
-    #         self.on_image_selected(self.image_table.selectionModel().selection(), None)
+        """
+        Move the selection to the image after the current one.
+        """
+        self.image_grid.select_row(self.image_grid.current_row() + 1)
+
+    def prefetch_neighbors(self):
+        """
+        Decode the images around the current one in the background,
+        so stepping with the arrow keys hits the decoded-image cache.
+        """
+        if self.prefetcher is None:
+            return
+        row = self.image_grid.current_row()
+        if row < 0:
+            return
+        paths = self.image_grid.filepaths_around(row, self.prefetch_count)
+        self.prefetcher.prefetch(paths, self.detail_panel.viewport_size())
 
     def run(self):
         """
-        Final setup after initialization, called from main.
+        Final setup after initialization, called from main once the window is shown.
         """
-        self.image_grid.set_images(self.images)
-        
         # Connect the image selection change signal to its handler
         # This will update the detail panel when a new image is selected.
         self.image_grid.selection_changed.connect(self.on_image_selected)
@@ -140,3 +660,11 @@ class AppController:
         # Connect the detail panel's tag change signal to the handler
         # Assuming detail_panel has a signal 'tag_changed' with args (image_id, tag_id, value).
         self.detail_panel.tag_changed.connect(self.handle_tag_changed)
+        self.detail_panel.tag_changed_for_images.connect(self.handle_tag_changed_for_images)
+        self.image_grid.perceptual_hash_ready.connect(self.on_perceptual_hash)
+
+        # Watch registered folders for new, changed and deleted files (from the end of loading)
+        if self.folder_watcher is not None:
+            self.folder_watcher.changes_ready.connect(self.sync_changes)
+
+        self.load_library()
@@ -1,7 +1,17 @@
 import sqlite3
 import os
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from content_hash import hash_file
+from folder_walker import FolderWalker
+import instrumentation
+from image_catalog import ImageCatalog
+from image_probe import get_image_size
+from perceptual_hash import to_signed, to_unsigned
 
 @dataclass
 class TagItem:
@@ -22,78 +32,104 @@ class GroupItem:
     name: str
     images: List[ImageItem]
 
-def get_image_size(path: str) -> Tuple[int, int]:
-    """
-    Get image size (width, height) without external libraries.
-    Supports JPEG, PNG, GIF, BMP formats.
-    Returns (0, 0) if cannot determine.
-    """
-    try:
-        with open(path, 'rb') as f:
-            header = f.read(26)
-    except Exception:
-        return 0, 0
-
-    # PNG: signature is 8 bytes
-    if header[:8] == b'\211PNG\r\n\032\n':
-        # IHDR chunk starts at byte 12
-        if header[12:16] == b'IHDR':
-            width = int.from_bytes(header[16:20], 'big')
-            height = int.from_bytes(header[20:24], 'big')
-            return width, height
-
-    # JPEG: starts with 0xFFD8
-    if header[:2] == b'\xff\xd8':
-        try:
-            with open(path, 'rb') as f:
-                f.read(2)
-                b = f.read(1)
-                while b and b != b'\xFF':
-                    b = f.read(1)
-                while b == b'\xFF':
-                    marker = f.read(1)
-                    if not marker:
-                        break
-                    if 0xC0 <= marker[0] <= 0xC3:
-                        f.read(3)  # skip length and precision
-                        h = int.from_bytes(f.read(2), 'big')
-                        w = int.from_bytes(f.read(2), 'big')
-                        return w, h
-                    else:
-                        length = int.from_bytes(f.read(2), 'big')
-                        f.read(length - 2)
-                    b = f.read(1)
-        except Exception:
-            return 0, 0
-
-    # GIF: first 6 bytes are signature, next 4 bytes are width and height (little-endian)
-    if header[:6] in (b'GIF87a', b'GIF89a'):
-        width = int.from_bytes(header[6:8], 'little')
-        height = int.from_bytes(header[8:10], 'little')
-        return width, height
-
-    # BMP: starts with 'BM', width and height at offsets 18 and 22 (little-endian)
-    if header[:2] == b'BM':
-        width = int.from_bytes(header[18:22], 'little')
-        height = int.from_bytes(header[22:26], 'little')
-        return width, height
-
-    return 0, 0
+@dataclass
+class IngestReport:
+    added: int = 0
+    skipped: int = 0
+    failed: int = 0
+    updated: int = 0
+    removed: int = 0
+    hashed: int = 0
+    elapsed: float = 0.0
+    # Ids of the rows inserted by this ingest, ascending
+    added_ids: List[int] = field(default_factory=list)
+    # Ids of the rows re-probed and of the rows deleted
+    updated_ids: List[int] = field(default_factory=list)
+    removed_ids: List[int] = field(default_factory=list)
+
+DEFAULT_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.tif', '.webp']
+
+# Number of rows written per executemany call during folder ingest
+INGEST_CHUNK_SIZE = 500
+
+# Images per page yielded by DatabaseManager.iter_image_catalog
+CATALOG_PAGE_SIZE = 20000
+
+# Connection tuning applied in DatabaseManager._configure_connection
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_CACHE_KIB = 64 * 1024
 
 class DatabaseManager:
-    def __init__(self, db_path: str = 'image_tags.db'):
+    def __init__(self, db_path: str = 'image_tags.db', probe_workers: Optional[int] = None,
+                 read_only: bool = False):
         """
         Initialize the database manager and create tables if they do not exist.
+        probe_workers sets the thread count used to read image headers during
+        ingest (None - ThreadPoolExecutor default, 1 - probe serially).
+        read_only opens an existing database for queries only and skips migrations.
+        """
+        self.probe_workers = probe_workers
+        self.read_only = read_only
+        if read_only:
+            self.conn = sqlite3.connect(Path(db_path).absolute().as_uri() + "?mode=ro", uri=True)
+        else:
+            self.conn = sqlite3.connect(db_path)
+        self.sql_tracer = instrumentation.register_connection(self.conn)
+        self._configure_connection()
+        if not read_only:
+            self._initialize_db()
+
+    def _configure_connection(self) -> None:
+        """
+        Apply connection pragmas: WAL journal, NORMAL sync, memory-mapped reads and a larger page cache.
+        WAL with synchronous=NORMAL only fsyncs at checkpoints and lets readers run alongside a writer.
         """
-        self.conn = sqlite3.connect(db_path)
         self.conn.execute("PRAGMA foreign_keys = 1")
-        self._initialize_db()
+        if not self.read_only:
+            # The journal mode is stored in the file, so only the writer sets it
+            self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        # Negative cache_size is in KiB
+        self.conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KIB}")
 
     def _initialize_db(self) -> None:
+        """
+        Bring the schema up to date by running pending migrations.
+        The schema version is stored in PRAGMA user_version, and each migration runs
+        in its own transaction, so an existing image_tags.db is upgraded in place.
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, migrate in self._migrations():
+            if target <= version:
+                continue
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("BEGIN")
+                migrate(cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+
+    def _migrations(self):
+        """
+        Return (schema version, migration) pairs in order. Append new migrations; never edit old ones.
+        """
+        return [
+            (1, self._migrate_base_schema),
+            (2, self._migrate_file_fingerprints),
+            (3, self._migrate_lookup_indexes),
+            (4, self._migrate_content_hashes),
+            (5, self._migrate_perceptual_hashes),
+        ]
+
+    def _migrate_base_schema(self, cursor: sqlite3.Cursor) -> None:
         """
         Create database tables: images, tags, image_tags, groups, group_images.
+        Databases created before versioning already have them, hence IF NOT EXISTS.
         """
-        cursor = self.conn.cursor()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS images (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -132,60 +168,403 @@ class DatabaseManager:
                 FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE
             )
         """)
-        self.conn.commit()
 
-    def add_folder(self, path: str, extensions: Optional[List[str]] = None) -> None:
+    def _migrate_file_fingerprints(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Add (mtime, size) columns used by rescan_folder.
+        Unversioned databases may already have them, so only missing columns are added.
+        """
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(images)")}
+        for column, column_type in (("mtime", "REAL"), ("size", "INTEGER")):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE images ADD COLUMN {column} {column_type}")
+
+    def _migrate_lookup_indexes(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Index the reverse sides of the link tables: images by tag, and groups by image
+        (also used by ON DELETE CASCADE when images are removed).
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_image_tags_tag ON image_tags(tag_id, image_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_group_images_image ON group_images(image_id)")
+
+    def _migrate_content_hashes(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Add the optional content_hash column used for duplicate detection,
+        with indexes for the same-size pre-filter and for grouping by hash.
+        """
+        cursor.execute("ALTER TABLE images ADD COLUMN content_hash TEXT")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_size ON images(size)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_content_hash ON images(content_hash)")
+
+    def _migrate_perceptual_hashes(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Add the perceptual_hash column (64-bit dHash stored as a signed INTEGER).
+        """
+        cursor.execute("ALTER TABLE images ADD COLUMN perceptual_hash INTEGER")
+
+    @instrumentation.timed("db.add_folder")
+    def add_folder(self, path: str, extensions: Optional[List[str]] = None, recursive: bool = False,
+                   include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                   max_depth: Optional[int] = None, hash_contents: bool = False) -> IngestReport:
         """
         Add all image files from the specified folder to the database.
         Only files with extensions in the provided list are added.
+        With recursive=True subfolders are walked too, optionally limited by
+        include/exclude name globs and max_depth (see FolderWalker).
+        Files already in the database are skipped without being probed.
+        Rows are written in chunks with executemany inside a single transaction.
+        With hash_contents=True, files sharing their size with another image are
+        hashed afterwards for duplicate detection (see update_content_hashes).
+        Returns an IngestReport with added/skipped/failed counts, timing and
+        the ids of the inserted rows (see get_image_catalog(after_id=...)).
         """
-        if extensions is None:
-            extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.tif']
-        # Ensure folder path is absolute
-        folder = os.path.abspath(path)
-        if not os.path.isdir(folder):
-            return
-        for filename in os.listdir(folder):
-            file_path = os.path.join(folder, filename)
-            if os.path.isdir(file_path):
+        return self._sync_folder(FolderWalker(path, extensions or DEFAULT_EXTENSIONS, recursive,
+                                              include, exclude, max_depth), False, hash_contents)
+
+    @instrumentation.timed("db.rescan_folder")
+    def rescan_folder(self, path: str, extensions: Optional[List[str]] = None, recursive: bool = False,
+                      include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                      max_depth: Optional[int] = None, hash_contents: bool = False) -> IngestReport:
+        """
+        Bring the database in line with the current contents of a folder.
+        New files are added, files whose (mtime, size) changed are re-probed,
+        and images whose files are gone are removed along with their tags.
+        Unchanged files are not opened at all. Walk options match add_folder;
+        only images the walk would visit are considered for removal.
+        A folder that is missing entirely (e.g. an unmounted share) is left untouched.
+        """
+        return self._sync_folder(FolderWalker(path, extensions or DEFAULT_EXTENSIONS, recursive,
+                                              include, exclude, max_depth), True, hash_contents)
+
+    @instrumentation.timed("db.sync_paths")
+    def sync_paths(self, paths: List[str], extensions: Optional[List[str]] = None,
+                   hash_contents: bool = False) -> IngestReport:
+        """
+        Bring the database in line with specific files, e.g. those reported by a folder watcher.
+        Each path is stat()ed: new files are added, files whose (mtime, size) changed
+        are re-probed, and stored images whose file is gone are removed.
+        Only the given paths are looked up, so no folder is listed.
+        Paths without an image extension are ignored.
+        """
+        report = IngestReport()
+        started = time.perf_counter()
+        extensions = {ext.lower() for ext in extensions or DEFAULT_EXTENSIONS}
+        paths = sorted({os.path.abspath(path) for path in paths
+                        if os.path.splitext(path)[1].lower() in extensions})
+        known: Dict[str, Tuple[int, Optional[float], Optional[int]]] = {}
+        for start in range(0, len(paths), INGEST_CHUNK_SIZE):
+            chunk = paths[start:start + INGEST_CHUNK_SIZE]
+            cursor = self.conn.execute(
+                f"SELECT id, filepath, mtime, size FROM images WHERE filepath IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            known.update((filepath, (img_id, mtime, size)) for img_id, filepath, mtime, size in cursor)
+
+        last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM images").fetchone()[0]
+        new_files: List[Tuple[str, float, int]] = []
+        changed_files: List[Tuple[int, str, float, int]] = []
+        missing: List[int] = []
+        for path in paths:
+            row = known.get(path)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                if row is not None:
+                    missing.append(row[0])
+                continue
+            except OSError:
+                report.failed += 1
                 continue
-            ext = os.path.splitext(filename)[1].lower()
-            if ext in extensions:
-                self._add_image(file_path)
-#TODO async
-    def _add_image(self, file_path: str) -> None:
+            if row is None:
+                new_files.append((path, stat.st_mtime, stat.st_size))
+            elif (row[1], row[2]) != (stat.st_mtime, stat.st_size):
+                changed_files.append((row[0], path, stat.st_mtime, stat.st_size))
+            else:
+                report.skipped += 1
+
+        executor = ThreadPoolExecutor(max_workers=self.probe_workers) if self.probe_workers != 1 else None
+        try:
+            for start in range(0, len(new_files), INGEST_CHUNK_SIZE):
+                self._insert_images(new_files[start:start + INGEST_CHUNK_SIZE], executor, report)
+            for start in range(0, len(changed_files), INGEST_CHUNK_SIZE):
+                self._update_images(changed_files[start:start + INGEST_CHUNK_SIZE], executor, report)
+            if hash_contents and (report.added or report.updated):
+                report.hashed = self._hash_same_size_images(executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if missing:
+            self._remove_images(missing, report)
+        self.conn.commit()
+        if report.added:
+            report.added_ids = [row[0] for row in self.conn.execute(
+                "SELECT id FROM images WHERE id > ? ORDER BY id", (last_id,))]
+
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _sync_folder(self, walker: FolderWalker, rescan: bool, hash_contents: bool = False) -> IngestReport:
+        report = IngestReport()
+        started = time.perf_counter()
+        if not os.path.isdir(walker.folder):
+            return report
+
+        known = self._known_files(walker)
+        # Ids are AUTOINCREMENT, so every row inserted below gets an id above this one
+        last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM images").fetchone()[0]
+        new_files: List[Tuple[str, float, int]] = []
+        changed_files: List[Tuple[int, str, float, int]] = []
+        executor = ThreadPoolExecutor(max_workers=self.probe_workers) if self.probe_workers != 1 else None
+        try:
+            for entry in walker:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    report.failed += 1
+                    continue
+                row = known.pop(entry.path, None)
+                if row is None:
+                    new_files.append((entry.path, stat.st_mtime, stat.st_size))
+                elif rescan and (row[1], row[2]) != (stat.st_mtime, stat.st_size):
+                    changed_files.append((row[0], entry.path, stat.st_mtime, stat.st_size))
+                else:
+                    report.skipped += 1
+                if len(new_files) >= INGEST_CHUNK_SIZE:
+                    self._insert_images(new_files, executor, report)
+                    new_files = []
+                if len(changed_files) >= INGEST_CHUNK_SIZE:
+                    self._update_images(changed_files, executor, report)
+                    changed_files = []
+            if new_files:
+                self._insert_images(new_files, executor, report)
+            if changed_files:
+                self._update_images(changed_files, executor, report)
+            if hash_contents and (report.added or report.updated):
+                report.hashed = self._hash_same_size_images(executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if rescan and known:
+            # Files under folders that failed to list are not known to be gone
+            missing = [row[0] for filepath, row in known.items()
+                       if not filepath.startswith(tuple(walker.unreadable))]
+            if missing:
+                self._remove_images(missing, report)
+        self.conn.commit()
+        if report.added:
+            report.added_ids = [row[0] for row in self.conn.execute(
+                "SELECT id FROM images WHERE id > ? ORDER BY id", (last_id,))]
+
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _known_files(self, walker: FolderWalker) -> Dict[str, Tuple[int, Optional[float], Optional[int]]]:
+        """
+        Return filepath -> (id, mtime, size) for stored images that the walk would visit.
+        """
+        prefix = os.path.join(walker.folder, '')
+        # Range scan over the UNIQUE filepath index instead of LIKE
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT id, filepath, mtime, size FROM images WHERE filepath >= ? AND filepath < ?",
+            (prefix, upper)
+        )
+        return {
+            filepath: (img_id, mtime, size)
+            for img_id, filepath, mtime, size in cursor
+            if walker.accepts(filepath)
+        }
+
+    def _probe_sizes(self, paths: List[str], executor: Optional[ThreadPoolExecutor]) -> List[Tuple[int, int]]:
         """
-        Add a single image to the database with its size.
+        Read image sizes for a chunk of paths, overlapping file I/O across the
+        worker pool when one is given. Result order always matches `paths`.
         """
-        abs_path = os.path.abspath(file_path)
-        width, height = get_image_size(abs_path)
+        if executor is None:
+            return list(map(get_image_size, paths))
+        return list(executor.map(get_image_size, paths))
+    def _insert_images(self, files: List[Tuple[str, float, int]], executor: Optional[ThreadPoolExecutor],
+                       report: IngestReport) -> None:
+        """
+        Probe and insert a chunk of new (filepath, mtime, size) files with a single executemany.
+        Does not commit; the caller commits once after the last chunk.
+        """
+        sizes = self._probe_sizes([f[0] for f in files], executor)
+        rows = [(path, width, height, mtime, size)
+                for (path, mtime, size), (width, height) in zip(files, sizes)]
+        changes_before = self.conn.total_changes
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                "INSERT OR IGNORE INTO images (filepath, width, height) VALUES (?, ?, ?)",
-                (abs_path, width, height)
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO images (filepath, width, height, mtime, size) VALUES (?, ?, ?, ?, ?)",
+                rows
             )
-            self.conn.commit()
         except sqlite3.Error as e:
-            print(f"Error adding image {file_path}: {e}")
-#TODO async
+            instrumentation.count("db.errors")
+            print(f"Error adding images: {e}")
+            added = self.conn.total_changes - changes_before
+            report.added += added
+            report.failed += len(rows) - added
+            return
+        added = self.conn.total_changes - changes_before
+        report.added += added
+        report.skipped += len(rows) - added
+
+    def _update_images(self, files: List[Tuple[int, str, float, int]], executor: Optional[ThreadPoolExecutor],
+                       report: IngestReport) -> None:
+        """
+        Re-probe a chunk of changed (id, filepath, mtime, size) files and store the new sizes.
+        """
+        sizes = self._probe_sizes([f[1] for f in files], executor)
+        rows = [(width, height, mtime, size, img_id)
+                for (img_id, _, mtime, size), (width, height) in zip(files, sizes)]
+        try:
+            self.conn.executemany(
+                "UPDATE images SET width = ?, height = ?, mtime = ?, size = ?, content_hash = NULL, "
+                "perceptual_hash = NULL WHERE id = ?",
+                rows
+            )
+            report.updated += len(rows)
+            report.updated_ids.extend(row[-1] for row in rows)
+        except sqlite3.Error as e:
+            instrumentation.count("db.errors")
+            print(f"Error updating images: {e}")
+            report.failed += len(rows)
+
+    @instrumentation.timed("db.update_content_hashes")
+    def update_content_hashes(self) -> int:
+        """
+        Hash every image that shares its size with another image and has no hash yet.
+        Files with a unique size cannot have a duplicate and are never read.
+        Returns the number of images hashed.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.probe_workers) if self.probe_workers != 1 else None
+        try:
+            hashed = self._hash_same_size_images(executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.conn.commit()
+        return hashed
+
+    def _hash_same_size_images(self, executor: Optional[ThreadPoolExecutor]) -> int:
+        """
+        Hash unhashed same-size images in chunks, reading files in parallel on the executor.
+        Does not commit.
+        """
+        cursor = self.conn.execute("""
+            SELECT id, filepath FROM images
+            WHERE content_hash IS NULL
+              AND size IN (SELECT size FROM images WHERE size IS NOT NULL GROUP BY size HAVING COUNT(*) > 1)
+        """)
+        candidates = cursor.fetchall()
+        hashed = 0
+        for start in range(0, len(candidates), INGEST_CHUNK_SIZE):
+            chunk = candidates[start:start + INGEST_CHUNK_SIZE]
+            paths = [filepath for _, filepath in chunk]
+            digests = list(executor.map(hash_file, paths)) if executor else list(map(hash_file, paths))
+            rows = [(digest, img_id) for (img_id, _), digest in zip(chunk, digests) if digest is not None]
+            self.conn.executemany("UPDATE images SET content_hash = ? WHERE id = ?", rows)
+            hashed += len(rows)
+        return hashed
+
+    @instrumentation.timed("db.find_duplicates")
+    def find_duplicates(self) -> List[List[ImageItem]]:
+        """
+        Return groups of images with identical content (by content_hash), each ordered by id.
+        Only images hashed by update_content_hashes or a hashing ingest are considered.
+        """
+        duplicate_hashes = """
+            SELECT content_hash FROM images
+            WHERE content_hash IS NOT NULL
+            GROUP BY content_hash HAVING COUNT(*) > 1
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT id, content_hash FROM images WHERE content_hash IN ({duplicate_hashes})")
+        hash_by_id = dict(cursor.fetchall())
+        groups: Dict[str, List[ImageItem]] = {}
+        for image in self._load_images(f"WHERE i.content_hash IN ({duplicate_hashes}) ORDER BY i.id"):
+            groups.setdefault(hash_by_id[image.id], []).append(image)
+        return list(groups.values())
+
+    @instrumentation.timed("db.merge_duplicate_tags")
+    def merge_duplicate_tags(self) -> int:
+        """
+        Give every image in a duplicate group the union of the group's tags.
+        Returns the number of tag links added.
+        """
+        return len(self.merge_duplicate_tag_links())
+
+    def merge_duplicate_tag_links(self) -> List[Tuple[int, int]]:
+        """
+        Same as merge_duplicate_tags, but returns the (image_id, tag_id) links added,
+        so loaded images can be updated without reading them again.
+        """
+        try:
+            with self.conn:
+                links = self.conn.execute("""
+                    SELECT DISTINCT dup.id, it.tag_id
+                    FROM images src
+                    JOIN image_tags it ON it.image_id = src.id
+                    JOIN images dup ON dup.content_hash = src.content_hash AND dup.id != src.id
+                    WHERE src.content_hash IS NOT NULL
+                      AND NOT EXISTS (SELECT 1 FROM image_tags own
+                                      WHERE own.image_id = dup.id AND own.tag_id = it.tag_id)
+                """).fetchall()
+                self.conn.executemany("INSERT OR IGNORE INTO image_tags (image_id, tag_id) VALUES (?, ?)", links)
+        except sqlite3.Error as e:
+            instrumentation.count("db.errors")
+            print(f"Error merging duplicate tags: {e}")
+            return []
+        return links
+
+    @instrumentation.timed("db.get_perceptual_hashes")
+    def get_perceptual_hashes(self) -> List[Tuple[int, int]]:
+        """
+        Return (image_id, hash) for every image with a perceptual hash, as unsigned 64-bit values.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, perceptual_hash FROM images WHERE perceptual_hash IS NOT NULL")
+        return [(image_id, to_unsigned(value)) for image_id, value in cursor]
+
+    @instrumentation.timed("db.set_perceptual_hashes")
+    def set_perceptual_hashes(self, hashes: List[Tuple[int, int]]) -> bool:
+        """
+        Store (image_id, hash) pairs in one transaction; images deleted meanwhile are ignored.
+        """
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE images SET perceptual_hash = ? WHERE id = ?",
+                    [(to_signed(value), image_id) for image_id, value in hashes]
+                )
+            return True
+        except sqlite3.Error as e:
+            instrumentation.count("db.errors")
+            print(f"Error storing perceptual hashes: {e}")
+            return False
+
+    def _remove_images(self, image_ids: List[int], report: IngestReport) -> None:
+        """
+        Delete images whose files no longer exist; tags and group links cascade.
+        """
+        try:
+            self.conn.executemany("DELETE FROM images WHERE id = ?", [(img_id,) for img_id in image_ids])
+            report.removed += len(image_ids)
+            report.removed_ids.extend(image_ids)
+        except sqlite3.Error as e:
+            instrumentation.count("db.errors")
+            print(f"Error removing images: {e}")
+            report.failed += len(image_ids)
+    @instrumentation.timed("db.get_image")
     def get_image(self, image_id: int) -> Optional[ImageItem]:
         """
         Fetch a single image by ID, including its tags.
         Returns ImageItem or None if not found.
         """
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT id, filepath, width, height FROM images WHERE id = ?",
-            (image_id,)
-        )
-        row = cursor.fetchone()
-        if not row:
-            return None
-        tags = self.get_tags(image_id)
-        return ImageItem(id=row[0], filepath=row[1], width=row[2], height=row[3], tags=tags)
+        images = self._load_images("WHERE i.id = ?", (image_id,))
+        return images[0] if images else None
 
-#TODO async
     def get_tags(self, image_id: int) -> List[str]:
         """
         Return a list of tag names associated with the given image ID.
@@ -199,7 +578,7 @@ class DatabaseManager:
         """, (image_id,))
         rows = cursor.fetchall()
         return [row[0] for row in rows]
-#TODO async
+    @instrumentation.timed("db.set_tag")
     def set_tag(self, image_id: int, tag_id: int, value: bool) -> None:
         """
         Add or remove a tag from an image.
@@ -214,6 +593,7 @@ class DatabaseManager:
                 )
                 self.conn.commit()
             except sqlite3.Error as e:
+                instrumentation.count("db.errors")
                 print(f"Error adding tag: {e}")
         else:
             cursor.execute(
@@ -221,7 +601,40 @@ class DatabaseManager:
                 (image_id, tag_id)
             )
             self.conn.commit()
-#TODO async
+
+    def set_tag_for_images(self, image_ids: List[int], tag_id: int, value: bool) -> bool:
+        """
+        Add (value=True) or remove (value=False) one tag on many images in a single transaction.
+        """
+        return self.apply_tag_changes([(image_id, tag_id, value) for image_id in image_ids])
+
+    @instrumentation.timed("db.apply_tag_changes")
+    def apply_tag_changes(self, changes: List[Tuple[int, int, bool]]) -> bool:
+        """
+        Apply many (image_id, tag_id, value) changes in a single transaction.
+        Changes for images or tags that no longer exist are skipped.
+        Returns False (and rolls back) if the write fails.
+        """
+        added = [(image_id, tag_id) for image_id, tag_id, value in changes if value]
+        removed = [(image_id, tag_id) for image_id, tag_id, value in changes if not value]
+        try:
+            with self.conn:
+                if added:
+                    self.conn.executemany("""
+                        INSERT OR IGNORE INTO image_tags (image_id, tag_id)
+                        SELECT i.id, t.id FROM images i, tags t WHERE i.id = ? AND t.id = ?
+                    """, added)
+                if removed:
+                    self.conn.executemany(
+                        "DELETE FROM image_tags WHERE image_id = ? AND tag_id = ?",
+                        removed
+                    )
+        except sqlite3.Error as e:
+            instrumentation.count("db.errors")
+            print(f"Error applying tag changes: {e}")
+            return False
+        return True
+    @instrumentation.timed("db.get_or_create_tag")
     def get_or_create_tag(self, name: str) -> TagItem:
         """
         Get a tag by name, or create it if it doesn't exist. Returns a TagItem.
@@ -235,6 +648,7 @@ class DatabaseManager:
         self.conn.commit()
         return TagItem(id=cursor.lastrowid, name=name)
 
+    @instrumentation.timed("db.get_all_tags")
     def get_all_tags(self) -> List[TagItem]:
         """
         Return a list of all tags in the database.
@@ -244,17 +658,104 @@ class DatabaseManager:
         rows = cursor.fetchall()
         return [TagItem(id=row[0], name=row[1]) for row in rows]
 
+    @instrumentation.timed("db.get_all_images")
     def get_all_images(self) -> List[ImageItem]:
         """
         Return a list of all images, including their tags.
         """
+        return self._load_images()
+
+    @instrumentation.timed("db.get_image_catalog")
+    def get_image_catalog(self, after_id: int = 0, image_ids: Optional[List[int]] = None,
+                          limit: Optional[int] = None) -> ImageCatalog:
+        """
+        Return images as a compact ImageCatalog (tag ids instead of per-image name lists).
+        Rows and tag pairs are streamed from two ordered scans without building ImageItems.
+        after_id limits the catalog to ids above it, e.g. the rows a folder ingest just added;
+        both scans are then range reads on the primary keys.
+        limit caps the number of images, for reading the library a page at a time.
+        image_ids limits it to the given images, e.g. the rows a sync re-probed.
+        """
+        tags = self.get_all_tags()
+        if image_ids is None and limit is None:
+            rows = self.conn.execute(
+                "SELECT id, filepath, width, height FROM images WHERE id > ? ORDER BY id", (after_id,))
+            pairs = self.conn.execute(
+                "SELECT image_id, tag_id FROM image_tags WHERE image_id > ? ORDER BY image_id", (after_id,))
+            return ImageCatalog.from_rows(rows, pairs, tags)
+        if image_ids is None:
+            rows = self.conn.execute(
+                "SELECT id, filepath, width, height FROM images WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)).fetchall()
+            if not rows:
+                return ImageCatalog(tags)
+            # Tag pairs of exactly this page: a range read up to its last id
+            pairs = self.conn.execute(
+                "SELECT image_id, tag_id FROM image_tags WHERE image_id > ? AND image_id <= ? ORDER BY image_id",
+                (after_id, rows[-1][0]))
+            return ImageCatalog.from_rows(rows, pairs, tags)
+        catalog = ImageCatalog(tags)
+        ids = sorted(set(image_ids))
+        for start in range(0, len(ids), INGEST_CHUNK_SIZE):
+            chunk = ids[start:start + INGEST_CHUNK_SIZE]
+            marks = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT id, filepath, width, height FROM images WHERE id IN ({marks}) ORDER BY id", chunk)
+            pairs = self.conn.execute(
+                f"SELECT image_id, tag_id FROM image_tags WHERE image_id IN ({marks}) ORDER BY image_id", chunk)
+            catalog.extend(ImageCatalog.from_rows(rows, pairs, tags))
+        return catalog
+
+    def iter_image_catalog(self, page_size: int = CATALOG_PAGE_SIZE, after_id: int = 0) -> Iterator[ImageCatalog]:
+        """
+        Yield the library as consecutive ImageCatalog pages in id order.
+        Each page continues after the last id of the previous one (keyset paging),
+        so every page is a range read however deep into the library it is,
+        and the first page can be shown before the rest has been read.
+        """
+        while True:
+            page = self.get_image_catalog(after_id, limit=page_size)
+            if len(page):
+                yield page
+            if len(page) < page_size:
+                return
+            after_id = page.ids[-1]
+
+    def _load_images(self, where: str = "", params: tuple = ()) -> List[ImageItem]:
+        """
+        Load images matching an optional clause over `images i` together with their tags.
+        Uses one query for the image rows and one for all their tag names,
+        grouped in Python, instead of a get_tags round trip per image.
+        """
         cursor = self.conn.cursor()
-        cursor.execute("SELECT id, filepath, width, height FROM images")
-        images: List[ImageItem] = []
-        for img_id, filepath, width, height in cursor.fetchall():
-            tags = self.get_tags(img_id)
-            images.append(ImageItem(id=img_id, filepath=filepath, width=width, height=height, tags=tags))
-        return images
+        cursor.execute(f"SELECT i.id, i.filepath, i.width, i.height FROM images i {where}", params)
+        rows = cursor.fetchall()
+        if not rows:
+            return []
+
+        tags_by_image = {row[0]: [] for row in rows}
+        if where:
+            cursor.execute(f"""
+                SELECT it.image_id, t.name
+                FROM image_tags it
+                JOIN tags t ON t.id = it.tag_id
+                WHERE it.image_id IN (SELECT i.id FROM images i {where})
+            """, params)
+        else:
+            cursor.execute("""
+                SELECT it.image_id, t.name
+                FROM image_tags it
+                JOIN tags t ON t.id = it.tag_id
+            """)
+        for img_id, name in cursor.fetchall():
+            tags = tags_by_image.get(img_id)
+            if tags is not None:
+                tags.append(name)
+
+        return [
+            ImageItem(id=img_id, filepath=filepath, width=width, height=height, tags=tags_by_image[img_id])
+            for img_id, filepath, width, height in rows
+        ]
 
     def create_group(self, name: str) -> int:
         """
@@ -288,6 +789,7 @@ class DatabaseManager:
             )
             self.conn.commit()
         except sqlite3.Error as e:
+            instrumentation.count("db.errors")
             print(f"Error adding image to group: {e}")
 
     def remove_from_group(self, group_id: int, image_id: int) -> None:
@@ -305,15 +807,7 @@ class DatabaseManager:
         """
         Return a list of ImageItems belonging to the specified group.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT i.id, i.filepath, i.width, i.height
-            FROM images i
-            JOIN group_images gi ON i.id = gi.image_id
-            WHERE gi.group_id = ?
-        """, (group_id,))
-        images: List[ImageItem] = []
-        for img_id, filepath, width, height in cursor.fetchall():
-            tags = self.get_tags(img_id)
-            images.append(ImageItem(id=img_id, filepath=filepath, width=width, height=height, tags=tags))
-        return images
+        return self._load_images(
+            "JOIN group_images gi ON i.id = gi.image_id WHERE gi.group_id = ?",
+            (group_id,)
+        )
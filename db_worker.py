@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from database import DatabaseManager
+
+# Read-only connections kept for background queries
+DEFAULT_READERS = 2
+
+class AsyncDatabase:
+    """
+    Thread-safe front end for DatabaseManager.
+    All writes run on one dedicated writer thread with its own connection, in
+    submission order, so they never contend with each other. Reads run on a small
+    pool whose threads each hold a read-only connection; with WAL they proceed
+    while the writer is busy. Every method returns a concurrent.futures.Future.
+    """
+
+    def __init__(self, db_path: str = 'image_tags.db', readers: int = DEFAULT_READERS,
+                 probe_workers: Optional[int] = None):
+        self.db_path = db_path
+        self.probe_workers = probe_workers
+        # Each executor thread keeps its DatabaseManager here
+        self._local = threading.local()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer',
+                                          initializer=self._open, initargs=(False,))
+        # Open the writer first so pending migrations finish before any reader connects
+        self._writer.submit(lambda: None).result()
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader',
+                                           initializer=self._open, initargs=(True,))
+
+    def _open(self, read_only: bool) -> None:
+        self._local.db = DatabaseManager(self.db_path, probe_workers=self.probe_workers, read_only=read_only)
+
+    def _call(self, name: str, args, kwargs):
+        db = self._local.db
+        # Pick up an instrumentation toggle made on another thread
+        db.sql_tracer.sync()
+        return getattr(db, name)(*args, **kwargs)
+
+    def read(self, name: str, *args, **kwargs) -> Future:
+        """
+        Run a read-only DatabaseManager method on the reader pool.
+        """
+        return self._readers.submit(self._call, name, args, kwargs)
+
+    def write(self, name: str, *args, **kwargs) -> Future:
+        """
+        Run a DatabaseManager method on the writer thread.
+        """
+        return self._writer.submit(self._call, name, args, kwargs)
+
+    def get_image(self, image_id: int) -> Future:
+        return self.read('get_image', image_id)
+
+    def get_tags(self, image_id: int) -> Future:
+        return self.read('get_tags', image_id)
+
+    def get_all_images(self) -> Future:
+        return self.read('get_all_images')
+
+    def get_image_catalog(self, after_id: int = 0, image_ids: Optional[List[int]] = None,
+                          limit: Optional[int] = None) -> Future:
+        return self.read('get_image_catalog', after_id, image_ids, limit)
+
+    def get_all_tags(self) -> Future:
+        return self.read('get_all_tags')
+
+    def set_tag(self, image_id: int, tag_id: int, value: bool) -> Future:
+        return self.write('set_tag', image_id, tag_id, value)
+
+    def apply_tag_changes(self, changes: List[Tuple[int, int, bool]]) -> Future:
+        return self.write('apply_tag_changes', changes)
+
+    def get_or_create_tag(self, name: str) -> Future:
+        return self.write('get_or_create_tag', name)
+
+    def add_folder(self, path: str, **kwargs) -> Future:
+        return self.write('add_folder', path, **kwargs)
+
+    def rescan_folder(self, path: str, **kwargs) -> Future:
+        return self.write('rescan_folder', path, **kwargs)
+
+    def sync_paths(self, paths: List[str], **kwargs) -> Future:
+        return self.write('sync_paths', paths, **kwargs)
+
+    def find_duplicates(self) -> Future:
+        return self.read('find_duplicates')
+
+    def update_content_hashes(self) -> Future:
+        return self.write('update_content_hashes')
+
+    def merge_duplicate_tags(self) -> Future:
+        return self.write('merge_duplicate_tags')
+
+    def merge_duplicate_tag_links(self) -> Future:
+        return self.write('merge_duplicate_tag_links')
+
+    def get_perceptual_hashes(self) -> Future:
+        return self.read('get_perceptual_hashes')
+
+    def set_perceptual_hashes(self, hashes: List[Tuple[int, int]]) -> Future:
+        return self.write('set_perceptual_hashes', hashes)
+
+    def close(self) -> None:
+        """
+        Finish all submitted work, then stop the threads.
+        """
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
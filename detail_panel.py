@@ -1,10 +1,15 @@
 # detail_panel.py
 
 from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QScrollArea, QPushButton
-from PyQt5.QtGui import QPixmap
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QPixmap, QImageReader
+from PyQt5.QtCore import Qt, pyqtSignal, QSize, QTimer
 import os
 
+from image_prefetcher import DecodedImageCache
+
+# Delay after the last resize before the image is decoded again for the new size
+RESIZE_DEBOUNCE_MS = 150
+
 class DetailPanel(QWidget):
     """
     DetailPanel displays a large image with file information and tag buttons.
@@ -13,8 +18,14 @@ class DetailPanel(QWidget):
 
     # Signal emitted when a tag button is toggled: args are (image_id, tag_id, new_state)
     tag_changed = pyqtSignal(int, int, bool)
-
-    def __init__(self, parent=None):
+    # Same for a multi-selection: args are (image_ids, tag_id, new_state)
+    tag_changed_for_images = pyqtSignal(list, int, bool)
+    # Emitted after each displayed image: decoded-cache hits, misses, average decode time in ms
+    decode_stats_changed = pyqtSignal(int, int, float)
+    # "Find Similar" was clicked for the displayed image: arg is image_id
+    find_similar_requested = pyqtSignal(int)
+
+    def __init__(self, parent=None, image_cache=None):
         super().__init__(parent)
         # Main vertical layout
         self.layout = QVBoxLayout(self)
@@ -31,6 +42,12 @@ class DetailPanel(QWidget):
         self.info_label.setAlignment(Qt.AlignCenter)
         self.layout.addWidget(self.info_label)
 
+        # Button to list near-duplicates (resized or re-encoded copies) of the displayed image
+        self.find_similar_button = QPushButton("Find Similar", self)
+        self.find_similar_button.setEnabled(False)
+        self.find_similar_button.clicked.connect(self._on_find_similar_clicked)
+        self.layout.addWidget(self.find_similar_button)
+
         # Layout for tag buttons
         self.tags_layout = QVBoxLayout()
         self.layout.addLayout(self.tags_layout)
@@ -38,7 +55,17 @@ class DetailPanel(QWidget):
         # Store buttons and current image
         self.tag_buttons = {}   # tag_id -> QPushButton
         self.current_image = None  # The currently displayed ImageItem
-        self._orig_pixmap = None
+        self.selected_images = []  # All selected ImageItems; tag buttons act on every one of them
+        self._source_size = QSize()  # Full resolution of the current file, read from its header
+        # Decoded images at viewport size, shared with the neighbor prefetcher
+        self.image_cache = image_cache if image_cache is not None else DecodedImageCache()
+        self._zoomed = False  # Showing the image at full resolution
+
+        # Re-decode only once resizing (e.g. dragging the splitter) has paused
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(RESIZE_DEBOUNCE_MS)
+        self._resize_timer.timeout.connect(self._update_pixmap_scaled)
 
 
     def set_tags_available(self, tags):
@@ -63,6 +90,7 @@ class DetailPanel(QWidget):
                 "QPushButton : pressed { background-color: #bbbbbb } "
                 "QPushButton:checked:hover { background-color: #428AFF; }"
                 "QPushButton:checked:pressed { background-color: #1a5fcc; }"
+                "QPushButton[mixed=\"true\"] { background-color: #cce0ff; border: 2px dashed #3399FF; }"
             )
             # Connect toggle to handler
             btn.toggled.connect(lambda checked, tid=tag.id: self._on_button_toggled(tid, checked))
@@ -70,56 +98,158 @@ class DetailPanel(QWidget):
             self.tag_buttons[tag.id] = btn
 
 #TODO make async
-    def set_image(self, image_item):
+    def set_image(self, image_item, selection=None):
         """
         Display a new ImageItem (with id, filepath, tags list).
         Loads image, updates info, and adjusts button states.
+        selection is the full list of selected ImageItems when several are selected;
+        buttons then show tags every image has as checked and tags only some have as mixed.
         """
         self.current_image = image_item
-        
-        # Load pixmap
-        pixmap = QPixmap(image_item.filepath)
-        if pixmap.isNull():
-            self._orig_pixmap = None
-            self.image_label.setText("Cannot load image")
-        else:
-            self._orig_pixmap = pixmap
-            self._update_pixmap_scaled()
+        self.selected_images = list(selection) if selection else [image_item]
+        self._zoomed = False
+        self.find_similar_button.setEnabled(True)
+
+        # Only the header is read here; pixels are decoded at viewport size below
+        self._source_size = QImageReader(image_item.filepath).size()
+        self._update_pixmap_scaled()
 
         # Update file info
         filename = os.path.basename(image_item.filepath)
-        resolution = f"{pixmap.width()} x {pixmap.height()}" if not pixmap.isNull() else ""
-        self.info_label.setText(f"{filename}    {resolution}")
+        resolution = f"{self._source_size.width()} x {self._source_size.height()}" if self._source_size.isValid() else ""
+        if len(self.selected_images) > 1:
+            self.info_label.setText(f"{filename}    {resolution}    ({len(self.selected_images)} selected)")
+        else:
+            self.info_label.setText(f"{filename}    {resolution}")
+
+        self._update_tag_buttons()
 
-        # Update tag buttons according to image_item.tags
-        active_tag_names = image_item.tags
+    def forget_images(self, image_ids):
+        """
+        Drop deleted images from the selection; if the displayed image is one
+        of them the panel is cleared.
+        """
+        removed = set(image_ids)
+        if self.current_image is not None and self.current_image.id in removed:
+            self.clear()
+            return
+        selected = [image for image in self.selected_images if image.id not in removed]
+        if len(selected) != len(self.selected_images):
+            self.selected_images = selected
+            self._update_tag_buttons()
+
+    def clear(self):
+        """
+        Show no image, e.g. after the displayed one was deleted.
+        """
+        self.current_image = None
+        self.selected_images = []
+        self._zoomed = False
+        self._resize_timer.stop()
+        self._source_size = QSize()
+        self.image_label.clear()
+        self.info_label.clear()
+        self.find_similar_button.setEnabled(False)
+        self._update_tag_buttons()
+
+    def refresh_tags(self):
+        """
+        Update the tag buttons after tags of the displayed images changed elsewhere.
+        """
+        self._update_tag_buttons()
+
+    def _update_tag_buttons(self):
+        """
+        Set button states from the tags of the selected images.
+        """
+        counts = {}
+        for image in self.selected_images:
+            for name in image.tags:
+                counts[name] = counts.get(name, 0) + 1
+        total = len(self.selected_images)
         for tag_id, btn in self.tag_buttons.items():
+            count = counts.get(btn.text(), 0)
             # Prevent signal while updating
             btn.blockSignals(True)
-            btn.setChecked(btn.text() in active_tag_names)
+            btn.setChecked(total > 0 and count == total)
             btn.blockSignals(False)
+            self._set_mixed(btn, 0 < count < total)
+
+    def _set_mixed(self, btn, mixed):
+        if btn.property("mixed") == mixed:
+            return
+        btn.setProperty("mixed", mixed)
+        # Re-apply the stylesheet so the [mixed] selector is picked up
+        btn.style().unpolish(btn)
+        btn.style().polish(btn)
 
     def _on_button_toggled(self, tag_id, checked):
         """
         Internal handler for button toggle.
-        Emits tag_changed signal with (image_id, tag_id, new_state).
+        Emits tag_changed signal with (image_id, tag_id, new_state),
+        or tag_changed_for_images when several images are selected.
         """
         if not self.current_image:
             return
+        self._set_mixed(self.tag_buttons[tag_id], False)
+        if len(self.selected_images) > 1:
+            # A mixed button is unchecked, so clicking it applies the tag to every image
+            self.tag_changed_for_images.emit([image.id for image in self.selected_images], tag_id, checked)
+            return
         image_id = self.current_image.id
         # Emit signal for controller to handle DB update
         self.tag_changed.emit(image_id, tag_id, checked)
 
+    def _on_find_similar_clicked(self):
+        if self.current_image:
+            self.find_similar_requested.emit(self.current_image.id)
+
+    def viewport_size(self):
+        """
+        Size the image is decoded at when fitted to the panel.
+        """
+        return self.scroll_area.viewport().size()
+
+    def mouseDoubleClickEvent(self, event):
+        """
+        Toggle between fit-to-viewport and full resolution.
+        """
+        super().mouseDoubleClickEvent(event)
+        if not self.current_image:
+            return
+        self._zoomed = not self._zoomed
+        self._update_pixmap_scaled()
+
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self._orig_pixmap:
-            self._update_pixmap_scaled()
+        if not self.current_image or self._zoomed:
+            return
+        # Cheap preview from what is already on screen; the real decode is debounced
+        shown = self.image_label.pixmap()
+        if shown is not None and not shown.isNull():
+            self.image_label.setPixmap(shown.scaled(
+                self.viewport_size(),
+                Qt.KeepAspectRatio,
+                Qt.FastTransformation
+            ))
+        self._resize_timer.start()
 
     def _update_pixmap_scaled(self):
-        viewport_size = self.scroll_area.viewport().size()
-        scaled = self._orig_pixmap.scaled(
-            viewport_size,
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
-        self.image_label.setPixmap(scaled)
+        if not self.current_image:
+            return
+        filepath = self.current_image.filepath
+        if self._zoomed:
+            # Full resolution is only decoded on demand
+            pixmap = QPixmap.fromImage(QImageReader(filepath).read())
+        else:
+            cache = self.image_cache
+            viewport_size = self.viewport_size()
+            image = cache.get(cache.key(filepath, viewport_size))
+            if image is None:
+                image = cache.decode(filepath, viewport_size)
+            pixmap = QPixmap.fromImage(image)
+            self.decode_stats_changed.emit(cache.hits, cache.misses, cache.average_decode_ms)
+        if pixmap.isNull():
+            self.image_label.setText("Cannot load image")
+        else:
+            self.image_label.setPixmap(pixmap)
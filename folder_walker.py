@@ -0,0 +1,73 @@
+import os
+from fnmatch import fnmatch
+from typing import Iterable, Iterator, List, Optional
+
+class FolderWalker:
+    """
+    Lazily walks a folder with os.scandir and yields a DirEntry for every matching image file.
+    Directory type information comes from the cached DirEntry data, so no extra
+    stat is made per entry, and paths are streamed instead of collected in a list.
+
+    - extensions: lower-case file extensions to accept (with the leading dot)
+    - recursive: descend into subfolders; when False only the folder itself is listed
+    - include: file name globs, at least one must match if given
+    - exclude: globs for file and folder names; excluded folders are not entered
+    - max_depth: how many levels below the folder to descend (None - unlimited)
+    """
+
+    def __init__(self, folder: str, extensions: Iterable[str], recursive: bool = False,
+                 include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 max_depth: Optional[int] = None):
+        self.folder = os.path.abspath(folder)
+        self.extensions = {ext.lower() for ext in extensions}
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.max_depth = max_depth if recursive else 0
+        # Folders that could not be listed during the last walk
+        self.unreadable: List[str] = []
+
+    def __iter__(self) -> Iterator[os.DirEntry]:
+        # Explicit stack of pending folders instead of recursion
+        self.unreadable = []
+        stack = [(self.folder, 0)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self._descends_into(entry.name, depth + 1):
+                                    stack.append((entry.path, depth + 1))
+                            elif entry.is_file() and self._accepts_file(entry.name):
+                                yield entry
+                        except OSError:
+                            continue
+            except OSError as e:
+                print(f"Error listing folder {directory}: {e}")
+                self.unreadable.append(os.path.join(directory, ''))
+
+    def accepts(self, path: str) -> bool:
+        """
+        Return True if the walk would visit the given absolute file path.
+        """
+        rel = os.path.relpath(path, self.folder)
+        if rel.startswith(os.pardir):
+            return False
+        parts = rel.split(os.sep)
+        for depth, name in enumerate(parts[:-1], start=1):
+            if not self._descends_into(name, depth):
+                return False
+        return self._accepts_file(parts[-1])
+
+    def _descends_into(self, name: str, depth: int) -> bool:
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        return not any(fnmatch(name, pattern) for pattern in self.exclude)
+
+    def _accepts_file(self, name: str) -> bool:
+        if os.path.splitext(name)[1].lower() not in self.extensions:
+            return False
+        if self.include and not any(fnmatch(name, pattern) for pattern in self.include):
+            return False
+        return not any(fnmatch(name, pattern) for pattern in self.exclude)
@@ -0,0 +1,163 @@
+import os
+from typing import Dict, List, Set
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QSocketNotifier, QTimer, pyqtSignal
+
+from inotify import open_inotify
+
+# Quiet period after the last event before a batch of changes is reported
+WATCH_DEBOUNCE_MS = 500
+# Longest a change waits while events keep arriving (e.g. during a long copy)
+WATCH_MAX_DELAY_MS = 5000
+# How often polled folders have their modification time checked
+POLL_INTERVAL_MS = 5000
+
+class FolderWatcher(QObject):
+    """
+    Watches registered folders (not their subfolders) and reports changes in batches.
+
+    Backends, best first:
+    - inotify (Linux): reports the exact files created, rewritten, moved or deleted,
+      so a burst of thousands of new files is handed on as a list of paths and no
+      folder is listed
+    - QFileSystemWatcher: only says that a folder changed; the folder is reported
+      for a re-sync of that one folder
+    - polling: for folders neither can watch (some network shares, watch limits,
+      folders missing for now). Only the folder's own mtime is stat()ed per poll;
+      it changes when files are created, renamed or deleted
+
+    Events are collected until WATCH_DEBOUNCE_MS pass without new ones, or at most
+    WATCH_MAX_DELAY_MS, then changes_ready(paths, folders) is emitted once.
+    """
+
+    # Changed file paths, and folders that need a full re-sync
+    changes_ready = pyqtSignal(list, list)
+
+    def __init__(self, parent=None, use_inotify: bool = True, poll_only: bool = False):
+        super().__init__(parent)
+        self.poll_only = poll_only
+        self._inotify = open_inotify() if use_inotify and not poll_only else None
+        self._notifier = None
+        if self._inotify is not None:
+            self._notifier = QSocketNotifier(self._inotify.fileno(), QSocketNotifier.Read, self)
+            self._notifier.activated.connect(self._on_inotify_ready)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._polled: Dict[str, float] = {}  # folder -> last seen mtime
+        self._dirty_paths: Set[str] = set()
+        self._dirty_folders: Set[str] = set()
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(WATCH_DEBOUNCE_MS)
+        self._debounce.timeout.connect(self.flush)
+        # Caps the delay when the debounce keeps being restarted
+        self._deadline = QTimer(self)
+        self._deadline.setSingleShot(True)
+        self._deadline.setInterval(WATCH_MAX_DELAY_MS)
+        self._deadline.timeout.connect(self.flush)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL_MS)
+        self._poll_timer.timeout.connect(self._poll)
+
+    def watch(self, folder: str) -> None:
+        folder = os.path.abspath(folder)
+        if folder in self.folders():
+            return
+        if not self._add_native_watch(folder):
+            self._start_polling(folder)
+
+    def unwatch(self, folder: str) -> None:
+        folder = os.path.abspath(folder)
+        if self._inotify is not None:
+            self._inotify.remove_watch(folder)
+        self._watcher.removePath(folder)
+        self._polled.pop(folder, None)
+        self._dirty_folders.discard(folder)
+
+    def folders(self) -> List[str]:
+        folders = list(self._watcher.directories()) + list(self._polled)
+        if self._inotify is not None:
+            folders += self._inotify.folders()
+        return folders
+
+    def close(self) -> None:
+        self._debounce.stop()
+        self._deadline.stop()
+        self._poll_timer.stop()
+        if self._inotify is not None:
+            self._notifier.setEnabled(False)
+            self._inotify.close()
+            self._inotify = None
+
+    def _add_native_watch(self, folder: str) -> bool:
+        if self.poll_only:
+            return False
+        if self._inotify is not None and self._inotify.add_watch(folder):
+            return True
+        return self._watcher.addPath(folder)
+
+    def _start_polling(self, folder: str) -> None:
+        try:
+            self._polled[folder] = os.stat(folder).st_mtime
+        except OSError:
+            # Missing for now (e.g. unmounted); picked up when it appears
+            self._polled[folder] = 0.0
+        if not self._poll_timer.isActive():
+            self._poll_timer.start()
+
+    def _on_inotify_ready(self) -> None:
+        paths, folders = self._inotify.read_changes()
+        for folder in folders:
+            # Overflowed or lost watches; lost ones are polled until the folder is back
+            if folder not in self._inotify.folders():
+                self._start_polling(folder)
+        self._mark_dirty(paths, folders)
+
+    def _on_directory_changed(self, folder: str) -> None:
+        folder = os.path.abspath(folder)
+        if folder not in self._watcher.directories():
+            # QFileSystemWatcher drops deleted or unmounted folders
+            self._start_polling(folder)
+        self._mark_dirty((), (folder,))
+
+    def _poll(self) -> None:
+        for folder, seen in list(self._polled.items()):
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                continue
+            if mtime == seen:
+                continue
+            self._polled[folder] = mtime
+            if self._add_native_watch(folder):
+                # Back (e.g. remounted) and watchable again
+                del self._polled[folder]
+            self._mark_dirty((), (folder,))
+        if not self._polled:
+            self._poll_timer.stop()
+
+    def _mark_dirty(self, paths, folders) -> None:
+        self._dirty_paths.update(paths)
+        self._dirty_folders.update(folders)
+        if not self._dirty_paths and not self._dirty_folders:
+            return
+        self._debounce.start()
+        if not self._deadline.isActive():
+            self._deadline.start()
+
+    def flush(self) -> None:
+        """
+        Emit pending changes now instead of waiting for the debounce window.
+        """
+        self._debounce.stop()
+        self._deadline.stop()
+        if not self._dirty_paths and not self._dirty_folders:
+            return
+        folders = sorted(self._dirty_folders)
+        # Files inside folders that are re-synced anyway need no separate lookup
+        paths = sorted(path for path in self._dirty_paths if os.path.dirname(path) not in self._dirty_folders)
+        self._dirty_paths.clear()
+        self._dirty_folders.clear()
+        self.changes_ready.emit(paths, folders)
@@ -0,0 +1,282 @@
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_NO_TAGS: Tuple[int, ...] = ()
+
+class ImageView:
+    """
+    Read-only ImageItem-compatible view of one catalog image.
+    A view holds the image id and finds its row on each access, so it always shows
+    current tags and stays valid when rows move up after catalog.remove().
+    Once its image is removed, reading anything but id raises LookupError.
+    """
+
+    __slots__ = ('_catalog', '_id')
+
+    def __init__(self, catalog: 'ImageCatalog', image_id: int):
+        self._catalog = catalog
+        self._id = image_id
+
+    @property
+    def _row(self) -> int:
+        row = self._catalog.row_of(self._id)
+        if row is None:
+            raise LookupError(f"Image {self._id} is no longer in the catalog")
+        return row
+
+    @property
+    def id(self) -> int:
+        return self._id
+
+    @property
+    def filepath(self) -> str:
+        return self._catalog.filepath(self._row)
+
+    @property
+    def width(self) -> int:
+        return self._catalog.widths[self._row]
+
+    @property
+    def height(self) -> int:
+        return self._catalog.heights[self._row]
+
+    @property
+    def tag_ids(self) -> Tuple[int, ...]:
+        return self._catalog.tag_ids(self._row)
+
+    @property
+    def tags(self) -> List[str]:
+        return self._catalog.tags(self._row)
+
+    def __eq__(self, other):
+        if isinstance(other, ImageView):
+            return self._catalog is other._catalog and self._id == other._id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self._catalog), self._id))
+
+    def __repr__(self):
+        return (f"ImageView(id={self.id}, filepath={self.filepath!r}, width={self.width}, "
+                f"height={self.height}, tags={self.tags!r})")
+
+class CatalogRows:
+    """
+    Sequence of ImageViews over chosen rows of an ImageCatalog, e.g. a filter result.
+    The rows are an array('q') of catalog row numbers, so a large result costs
+    8 bytes per image and views are only created on access. With ascending=True
+    positions are found by binary search, otherwise by a linear search in C.
+    Rows refer to the catalog as it is now; rebuild them after catalog.remove().
+    """
+
+    __slots__ = ('catalog', 'rows', 'ascending')
+
+    def __init__(self, catalog: 'ImageCatalog', rows: Iterable[int] = (), ascending: bool = True):
+        self.catalog = catalog
+        self.rows = rows if isinstance(rows, array) else array('q', rows)
+        self.ascending = ascending
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, position: int) -> ImageView:
+        return self.catalog[self.rows[position]]
+
+    def __iter__(self) -> Iterator[ImageView]:
+        return (self.catalog[row] for row in self.rows)
+
+    def row_of(self, image_id: int) -> Optional[int]:
+        """
+        Return the position of an image id among the rows, or None if it is not there.
+        """
+        row = self.catalog.row_of(image_id)
+        if row is None:
+            return None
+        if self.ascending:
+            position = bisect_left(self.rows, row)
+            if position < len(self.rows) and self.rows[position] == row:
+                return position
+            return None
+        try:
+            return self.rows.index(row)
+        except ValueError:
+            return None
+
+    def extend(self, other: 'CatalogRows') -> None:
+        """
+        Append the rows of another selection over the same catalog.
+        """
+        if self.rows and other.rows and other.rows[0] <= self.rows[-1]:
+            self.ascending = False
+        self.ascending = self.ascending and other.ascending
+        self.rows.extend(other.rows)
+
+class ImageCatalog:
+    """
+    Compact in-memory table of images, ordered by id.
+    Ids, widths and heights are typed arrays; filepaths are packed UTF-8 in one
+    buffer with an offsets array; each row's tags are a tuple of tag ids, and equal
+    tuples are shared between rows. Indexing returns an ImageView, created on demand.
+    Rows are looked up by id with a binary search, so no per-image dict is kept.
+    """
+
+    def __init__(self, tags: Iterable = ()):
+        self.ids = array('q')
+        self.widths = array('i')
+        self.heights = array('i')
+        self._paths = bytearray()
+        self._path_ends = array('q')
+        self._tag_ids: List[Tuple[int, ...]] = []
+        # One shared tuple per distinct tag combination
+        self._tag_sets: Dict[Tuple[int, ...], Tuple[int, ...]] = {_NO_TAGS: _NO_TAGS}
+        self.tag_names: Dict[int, str] = {}
+        self.set_tag_names(tags)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, str, int, int]],
+                  pairs: Iterable[Tuple[int, int]], tags: Iterable = ()) -> 'ImageCatalog':
+        """
+        Build a catalog from (id, filepath, width, height) rows in ascending id order
+        and (image_id, tag_id) pairs sorted by image_id.
+        """
+        catalog = cls(tags)
+        for image_id, filepath, width, height in rows:
+            catalog.append(image_id, filepath, width, height)
+        for image_id, group in groupby(pairs, key=itemgetter(0)):
+            row = catalog.row_of(image_id)
+            if row is not None:
+                catalog._tag_ids[row] = catalog._intern(tuple(tag_id for _, tag_id in group))
+        return catalog
+
+    def set_tag_names(self, tags: Iterable) -> None:
+        """
+        Register the known TagItems, used to turn tag ids into names.
+        """
+        self.tag_names = {tag.id: tag.name for tag in tags}
+
+    def append(self, image_id: int, filepath: str, width: int, height: int,
+               tag_ids: Tuple[int, ...] = _NO_TAGS) -> int:
+        """
+        Add an image with an id greater than any in the catalog and return its row.
+        """
+        if self.ids and image_id <= self.ids[-1]:
+            raise ValueError(f"Image id {image_id} is not greater than the last id {self.ids[-1]}")
+        self.ids.append(image_id)
+        self.widths.append(width or 0)
+        self.heights.append(height or 0)
+        self._paths += filepath.encode('utf-8', 'surrogateescape')
+        self._path_ends.append(len(self._paths))
+        self._tag_ids.append(self._intern(tuple(tag_ids)))
+        return len(self.ids) - 1
+
+    def extend(self, other: 'ImageCatalog') -> List[int]:
+        """
+        Merge rows of another catalog whose ids are above every id held here;
+        rows already present are skipped. Returns the rows that were appended.
+        """
+        added = []
+        for row in range(len(other)):
+            image_id = other.ids[row]
+            if self.ids and image_id <= self.ids[-1] and self.row_of(image_id) is not None:
+                continue
+            added.append(self.append(image_id, other.filepath(row), other.widths[row],
+                                     other.heights[row], other.tag_ids(row)))
+        self.tag_names.update(other.tag_names)
+        return added
+
+    def remove(self, image_ids: Iterable[int]) -> List[int]:
+        """
+        Delete images by id and return the rows they occupied, ascending.
+        The kept rows are copied slice by slice, so the cost is one pass over
+        the columns however many images are removed; later rows move up, which
+        views follow, but row numbers held elsewhere (CatalogRows) go stale.
+        """
+        rows = sorted(row for row in map(self.row_of, set(image_ids)) if row is not None)
+        if not rows:
+            return rows
+        ids, widths, heights = array('q'), array('i'), array('i')
+        paths, path_ends = bytearray(), array('q')
+        tag_ids: List[Tuple[int, ...]] = []
+        start = 0
+        for stop in rows + [len(self.ids)]:
+            if stop > start:
+                ids.extend(self.ids[start:stop])
+                widths.extend(self.widths[start:stop])
+                heights.extend(self.heights[start:stop])
+                tag_ids.extend(self._tag_ids[start:stop])
+                first = self._path_ends[start - 1] if start else 0
+                shift = first - len(paths)
+                paths += self._paths[first:self._path_ends[stop - 1]]
+                path_ends.extend(end - shift for end in self._path_ends[start:stop])
+            start = stop + 1
+        self.ids, self.widths, self.heights = ids, widths, heights
+        self._paths, self._path_ends, self._tag_ids = paths, path_ends, tag_ids
+        return rows
+
+    def set_size(self, row: int, width: int, height: int) -> None:
+        self.widths[row] = width or 0
+        self.heights[row] = height or 0
+
+    def _intern(self, tag_ids: Tuple[int, ...]) -> Tuple[int, ...]:
+        return self._tag_sets.setdefault(tag_ids, tag_ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, row: int) -> ImageView:
+        if row < 0:
+            row += len(self.ids)
+        if not 0 <= row < len(self.ids):
+            raise IndexError("ImageCatalog row out of range")
+        return ImageView(self, self.ids[row])
+
+    def __iter__(self) -> Iterator[ImageView]:
+        return (ImageView(self, image_id) for image_id in self.ids)
+
+    def row_of(self, image_id: int) -> Optional[int]:
+        """
+        Return the row of an image id, or None if it is not in the catalog.
+        """
+        row = bisect_left(self.ids, image_id)
+        if row < len(self.ids) and self.ids[row] == image_id:
+            return row
+        return None
+
+    def filepath(self, row: int) -> str:
+        start = self._path_ends[row - 1] if row else 0
+        return self._paths[start:self._path_ends[row]].decode('utf-8', 'surrogateescape')
+
+    def tag_ids(self, row: int) -> Tuple[int, ...]:
+        return self._tag_ids[row]
+
+    def tags(self, row: int) -> List[str]:
+        names = self.tag_names
+        return [names[tag_id] for tag_id in self._tag_ids[row] if tag_id in names]
+
+    def has_tag(self, row: int, tag_id: int) -> bool:
+        return tag_id in self._tag_ids[row]
+
+    def set_tag(self, row: int, tag_id: int, value: bool) -> bool:
+        """
+        Add or remove a tag on a row. Returns True if the row changed.
+        """
+        current = self._tag_ids[row]
+        if (tag_id in current) == value:
+            return False
+        if value:
+            updated = current + (tag_id,)
+        else:
+            updated = tuple(existing for existing in current if existing != tag_id)
+        self._tag_ids[row] = self._intern(updated)
+        return True
+
+    def image_tag_pairs(self) -> Iterator[Tuple[int, int]]:
+        """
+        Yield every (image_id, tag_id) pair held in the catalog.
+        """
+        for image_id, tag_ids in zip(self.ids, self._tag_ids):
+            for tag_id in tag_ids:
+                yield image_id, tag_id
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QSize
+from PyQt5.QtGui import QImage, QImageReader
+
+import instrumentation
+
+# Default memory budget for decoded DetailPanel images
+DEFAULT_DECODED_CACHE_BYTES = 256 * 1024 * 1024
+# Images decoded ahead in each direction while stepping through the grid
+DEFAULT_PREFETCH_COUNT = 3
+
+def read_scaled(filepath, target):
+    """
+    Decode an image at roughly the target size (KeepAspectRatio).
+    QImageReader.setScaledSize lets the decoder downscale while reading (JPEG
+    uses DCT scaling), so a 50MP file never has to be decoded in full.
+    Images smaller than the target are decoded as-is and scaled up.
+    Returns a null QImage if the file cannot be read. Safe to call off the GUI thread.
+    """
+    reader = QImageReader(filepath)
+    source_size = reader.size()
+    if source_size.isValid():
+        fitted = source_size.scaled(target, Qt.KeepAspectRatio)
+        if fitted.width() < source_size.width():
+            reader.setScaledSize(fitted)
+    image = reader.read()
+    if image.isNull() or target.isEmpty():
+        return image
+    if image.width() != target.width() and image.height() != target.height():
+        image = image.scaled(target, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return image
+
+class DecodedImageCache:
+    """
+    Memory-bounded LRU of decoded images keyed by (filepath, width, height).
+    Shared between the GUI thread and prefetch workers; access is serialized by a lock.
+    Also tracks hit rate and decode latency for both foreground and prefetch decodes.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_DECODED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.decodes = 0
+        self.decode_seconds = 0.0
+        self._bytes = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(filepath: str, size: QSize):
+        return (filepath, size.width(), size.height())
+
+    def contains(self, key) -> bool:
+        with self._lock:
+            return key in self._images
+
+    def get(self, key) -> Optional[QImage]:
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image: QImage) -> None:
+        size = image.sizeInBytes()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self._bytes -= old.sizeInBytes()
+            self._images[key] = image
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self._bytes -= evicted.sizeInBytes()
+
+    def decode(self, filepath: str, size: QSize) -> QImage:
+        """
+        Decode at viewport size, store the result and record the latency.
+        """
+        started = time.perf_counter()
+        image = read_scaled(filepath, size)
+        elapsed = time.perf_counter() - started
+        if instrumentation.enabled():
+            instrumentation.record("image.decode", elapsed)
+        with self._lock:
+            self.decodes += 1
+            self.decode_seconds += elapsed
+        if not image.isNull():
+            self.put(self.key(filepath, size), image)
+        return image
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def average_decode_ms(self) -> float:
+        return self.decode_seconds / self.decodes * 1000 if self.decodes else 0.0
+
+class PrefetchTask(QRunnable):
+
+    def __init__(self, cache, filepath, size):
+        super().__init__()
+        self.cache = cache
+        self.filepath = filepath
+        self.size = size
+
+    def run(self):
+        if self.cache.contains(self.cache.key(self.filepath, self.size)):
+            return
+        try:
+            self.cache.decode(self.filepath, self.size)
+        except Exception as e:
+            print(f"Error prefetching {self.filepath}: {e}")
+
+class ImagePrefetcher(QObject):
+    """
+    Decodes upcoming images into a DecodedImageCache on a small thread pool.
+    Each prefetch() call replaces work still queued from the previous one.
+    """
+
+    def __init__(self, cache: DecodedImageCache, parent=None, max_threads: int = 2):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+
+    def prefetch(self, filepaths: List[str], size: QSize):
+        """
+        Queue decodes for filepaths in priority order (nearest neighbor first).
+        """
+        self.pool.clear()
+        if size.isEmpty():
+            return
+        count = len(filepaths)
+        for index, filepath in enumerate(filepaths):
+            self.pool.start(PrefetchTask(self.cache, filepath, QSize(size)), count - index)
+
+    def shutdown(self):
+        self.pool.clear()
+        self.pool.waitForDone()
@@ -0,0 +1,163 @@
+import struct
+from typing import BinaryIO, Tuple
+
+import instrumentation
+
+# Bytes read up front; enough for the PNG, GIF, BMP and WebP headers
+HEADER_SIZE = 32
+# Read buffer for the file object, so marker scanning and small reads are served from memory
+BLOCK_SIZE = 8192
+
+# JPEG start-of-frame markers (baseline, extended, progressive, lossless, arithmetic).
+# 0xC4 (DHT), 0xC8 (JPG) and 0xCC (DAC) share the range but are not frames.
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xD9)) | {0x01}
+
+TIFF_TAG_IMAGE_WIDTH = 256
+TIFF_TAG_IMAGE_LENGTH = 257
+TIFF_TYPE_SHORT = 3
+TIFF_TYPE_LONG = 4
+
+@instrumentation.timed("probe.header")
+def get_image_size(path: str) -> Tuple[int, int]:
+    """
+    Get image size (width, height) without external libraries.
+    Supports JPEG, PNG, GIF, BMP, TIFF and WebP formats.
+    The file is opened once and read through a block buffer; JPEG and TIFF
+    segments that carry no size information are skipped with seek().
+    Returns (0, 0) if cannot determine.
+    """
+    try:
+        with open(path, 'rb', buffering=BLOCK_SIZE) as f:
+            header = f.read(HEADER_SIZE)
+            return _probe(f, header)
+    except (OSError, ValueError, struct.error):
+        return 0, 0
+
+def _probe(f: BinaryIO, header: bytes) -> Tuple[int, int]:
+    # PNG: signature is 8 bytes, IHDR chunk starts at byte 12
+    if header[:8] == b'\211PNG\r\n\032\n':
+        if header[12:16] == b'IHDR':
+            width, height = struct.unpack('>II', header[16:24])
+            return width, height
+        return 0, 0
+
+    # JPEG: starts with 0xFFD8
+    if header[:2] == b'\xff\xd8':
+        return _jpeg_size(f)
+
+    # GIF: first 6 bytes are signature, next 4 bytes are width and height (little-endian)
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack('<HH', header[6:10])
+        return width, height
+
+    # BMP: starts with 'BM', DIB header size at offset 14, then width and height
+    if header[:2] == b'BM':
+        return _bmp_size(header)
+
+    # TIFF: byte order mark followed by magic 42
+    if header[:4] in (b'II*\x00', b'MM\x00*'):
+        return _tiff_size(f, header)
+
+    # WebP: RIFF container with WEBP form type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return _webp_size(header)
+
+    return 0, 0
+
+def _jpeg_size(f: BinaryIO) -> Tuple[int, int]:
+    """
+    Walk JPEG markers until a start-of-frame segment is found.
+    """
+    f.seek(2)
+    while True:
+        b = f.read(1)
+        if not b:
+            return 0, 0
+        if b != b'\xff':
+            continue
+        marker = f.read(1)
+        # Any number of 0xFF fill bytes may precede a marker
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return 0, 0
+        code = marker[0]
+        if code in JPEG_STANDALONE_MARKERS:
+            continue
+        if code in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            return 0, 0
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return 0, 0
+        length = int.from_bytes(length_bytes, 'big')
+        if code in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return 0, 0
+            # precision (1 byte), height, width
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        # Skip the segment payload instead of reading it
+        f.seek(length - 2, 1)
+
+def _bmp_size(header: bytes) -> Tuple[int, int]:
+    dib_size = int.from_bytes(header[14:18], 'little')
+    if dib_size == 12:
+        # OS/2 BITMAPCOREHEADER uses 16-bit unsigned dimensions
+        width, height = struct.unpack('<HH', header[18:22])
+        return width, height
+    # Negative height marks a top-down bitmap
+    width, height = struct.unpack('<ii', header[18:26])
+    return abs(width), abs(height)
+
+def _tiff_size(f: BinaryIO, header: bytes) -> Tuple[int, int]:
+    """
+    Read ImageWidth/ImageLength from the first IFD, in either byte order.
+    """
+    endian = '<' if header[:2] == b'II' else '>'
+    ifd_offset = struct.unpack(endian + 'I', header[4:8])[0]
+    f.seek(ifd_offset)
+    count = struct.unpack(endian + 'H', f.read(2))[0]
+    entries = f.read(count * 12)
+    width = height = 0
+    for pos in range(0, len(entries) - 11, 12):
+        tag, field_type = struct.unpack(endian + 'HH', entries[pos:pos + 4])
+        if tag not in (TIFF_TAG_IMAGE_WIDTH, TIFF_TAG_IMAGE_LENGTH):
+            continue
+        if field_type == TIFF_TYPE_SHORT:
+            value = struct.unpack(endian + 'H', entries[pos + 8:pos + 10])[0]
+        elif field_type == TIFF_TYPE_LONG:
+            value = struct.unpack(endian + 'I', entries[pos + 8:pos + 12])[0]
+        else:
+            continue
+        if tag == TIFF_TAG_IMAGE_WIDTH:
+            width = value
+        else:
+            height = value
+        if width and height:
+            break
+    return width, height
+
+def _webp_size(header: bytes) -> Tuple[int, int]:
+    chunk = header[12:16]
+    if chunk == b'VP8 ':
+        # Lossy: 3-byte frame tag, start code 9D 01 2A, then 14-bit width and height
+        if header[23:26] != b'\x9d\x01\x2a':
+            return 0, 0
+        width, height = struct.unpack('<HH', header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        # Lossless: signature byte 0x2F, then width-1 and height-1 packed in 14 bits each
+        if header[20] != 0x2F:
+            return 0, 0
+        bits = int.from_bytes(header[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        # Extended: 4 bytes of flags, then 24-bit canvas width-1 and height-1
+        width = int.from_bytes(header[24:27], 'little') + 1
+        height = int.from_bytes(header[27:30], 'little') + 1
+        return width, height
+    return 0, 0
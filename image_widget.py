@@ -1,62 +1,334 @@
-from PyQt5.QtWidgets import QListWidget, QListWidgetItem
-from PyQt5.QtGui import QPixmap, QIcon
-from PyQt5.QtCore import Qt, pyqtSignal, QSize
+from collections import OrderedDict
+
+from PyQt5.QtWidgets import QListView
+from PyQt5.QtGui import QPixmap, QIcon, QColor
+from PyQt5.QtCore import Qt, pyqtSignal, QSize, QPoint, QTimer, QAbstractListModel, QModelIndex, QItemSelectionModel
 
 from database import ImageItem
+import instrumentation
+from image_catalog import CatalogRows, ImageCatalog
+from thumbnailer import THUMBNAIL_SIZE, Thumbnailer
+
+# Extra screens of rows above and below the viewport whose thumbnails are prefetched
+PREFETCH_SCREENS = 1
+# Delay before reacting to scrolling/resizing, so a fling does not queue every row it passes
+VISIBLE_UPDATE_DELAY_MS = 30
+# Decoded thumbnails kept in memory; older ones fall back to the placeholder and are re-requested
+MAX_CACHED_ICONS = 1000
+
+class ImageListModel(QAbstractListModel):
+    """
+    List model over ImageItems for the grid.
+    Text and icons are produced lazily in data(), so only rows the view paints cost anything.
+    Thumbnails live in a bounded LRU keyed by image id. An ImageCatalog, or CatalogRows
+    over one (a filter result), is used as is and finds rows by id itself; other
+    sequences are copied and get an id -> row index.
+    """
+
+    def __init__(self, parent=None, max_icons: int = MAX_CACHED_ICONS):
+        super().__init__(parent)
+        self.images = []
+        self._row_by_id = {}
+        self._row_count = 0
+        self._icons = OrderedDict()  # image id -> QIcon, least recently used first
+        self.max_icons = max_icons
+        placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        placeholder.fill(QColor(220, 220, 220))
+        self.placeholder_icon = QIcon(placeholder)
+
+    def set_images(self, images, keep_icons=False):
+        self.beginResetModel()
+        if isinstance(images, (ImageCatalog, CatalogRows)):
+            self.images = images
+            self._row_by_id = None
+        else:
+            self.images = list(images)
+            self._row_by_id = {image.id: row for row, image in enumerate(self.images)}
+        # Counted separately, so a shared catalog can grow before the rows are announced
+        self._row_count = len(self.images)
+        if not keep_icons:
+            self._icons.clear()
+        self.endResetModel()
+
+    def append_images(self, images):
+        """
+        Add rows at the end without touching existing rows or their icons.
+        For a catalog-backed model the images must already be appended to the catalog;
+        a CatalogRows-backed model takes the new rows as CatalogRows.
+        """
+        if not images:
+            return
+        first = self._row_count
+        self.beginInsertRows(QModelIndex(), first, first + len(images) - 1)
+        if isinstance(self.images, CatalogRows):
+            self.images.extend(images)
+        elif self._row_by_id is not None:
+            for image in images:
+                self._row_by_id[image.id] = len(self.images)
+                self.images.append(image)
+        self._row_count += len(images)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        image = self.images[index.row()]
+        if role == Qt.DisplayRole:
+            return ", ".join(image.tags)
+        if role == Qt.DecorationRole:
+            icon = self._icons.get(image.id)
+            if icon is None:
+                return self.placeholder_icon
+            self._icons.move_to_end(image.id)
+            return icon
+        if role == Qt.ToolTipRole:
+            return image.filepath
+        if role == Qt.UserRole:
+            return image
+        return None
+
+    def row_of(self, image_id):
+        if self._row_by_id is None:
+            return self.images.row_of(image_id)
+        return self._row_by_id.get(image_id)
+
+    def has_icon(self, row):
+        return self.images[row].id in self._icons
+
+    def set_icon(self, row, icon):
+        image_id = self.images[row].id
+        self._icons[image_id] = icon
+        self._icons.move_to_end(image_id)
+        while len(self._icons) > self.max_icons:
+            self._icons.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def update_image(self, image):
+        row = self.row_of(image.id)
+        if row is None:
+            return
+        if self._row_by_id is not None:
+            # Catalog views already read current data; plain lists hold copies
+            self.images[row] = image
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.UserRole])
+
+    def update_images(self, image_ids):
+        """
+        Repaint the rows of images whose tags changed, with one dataChanged
+        over the range they span. Only for models backed by a catalog, whose
+        views read current data.
+        """
+        rows = [row for row in map(self.row_of, image_ids) if row is not None]
+        if not rows:
+            return
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [Qt.DisplayRole, Qt.UserRole])
+
+    def refresh_images(self, image_ids):
+        """
+        Forget the icons of images whose files changed and repaint their rows.
+        """
+        for image_id in image_ids:
+            self._icons.pop(image_id, None)
+            row = self.row_of(image_id)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+
+    def icon_bytes(self):
+        """
+        Approximate memory held by decoded thumbnails (32-bit pixels).
+        """
+        return len(self._icons) * THUMBNAIL_SIZE * THUMBNAIL_SIZE * 4
 
-class ImageGrid(QListWidget):
+class ImageGrid(QListView):
 
-    def __init__(self, parent = None):
+    # Emitted when pending thumbnails are done, with the thumbnail cache (hits, misses)
+    thumbnail_stats_changed = pyqtSignal(int, int)
+    # Perceptual hash of a thumbnail, for near-duplicate search: image id, hash
+    perceptual_hash_ready = pyqtSignal(int, object)
+
+    def __init__(self, parent = None, thumbnail_cache = None, max_icons = MAX_CACHED_ICONS):
         super().__init__(parent)
 
-        self.setViewMode(QListWidget.IconMode)
+        self.image_model = ImageListModel(self, max_icons)
+        self.setModel(self.image_model)
+
+        # Thumbnails are decoded on a thread pool; rows show a placeholder until theirs arrives
+        self.thumbnailer = Thumbnailer(thumbnail_cache, THUMBNAIL_SIZE, self)
+        self.thumbnailer.thumbnail_ready.connect(self._on_thumbnail_ready)
+        self.thumbnailer.finished.connect(self.thumbnail_stats_changed)
+        self.thumbnailer.perceptual_hash_ready.connect(self._on_perceptual_hash_ready)
+
+        self._visible_timer = QTimer(self)
+        self._visible_timer.setSingleShot(True)
+        self._visible_timer.setInterval(VISIBLE_UPDATE_DELAY_MS)
+        self._visible_timer.timeout.connect(self._request_visible_thumbnails)
 
-        self.setResizeMode(QListWidget.Adjust)
+        self.setViewMode(QListView.IconMode)
 
-        self.setIconSize(QSize(128,128))
+        self.setResizeMode(QListView.Adjust)
+
+        self.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
         self.setGridSize(QSize(150,150))
+        # Every cell has the same size, so layout does not have to measure each row
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
 
-        self.setMovement(QListWidget.Static)
+        self.setMovement(QListView.Static)
 
-        self.setSelectionMode(QListWidget.ExtendedSelection)
-        self.itemSelectionChanged.connect(self._on_selection_changed)
+        self.setSelectionMode(QListView.ExtendedSelection)
+        self.selectionModel().selectionChanged.connect(self._on_selection_changed)
+        self.verticalScrollBar().valueChanged.connect(self._visible_timer.start)
 
 
+    @instrumentation.timed("grid.set_images")
     def set_images(self, images):
-        self.clear()
-        
-        for image_item in images:
-            item = QListWidgetItem()
+        self.thumbnailer.reset()
+        self.image_model.set_images(images)
+        self._visible_timer.start()
+
+    @instrumentation.timed("grid.append_images")
+    def append_images(self, images):
+        """
+        Show newly added images after the current ones; loaded thumbnails are kept.
+        """
+        self.image_model.append_images(images)
+        self._visible_timer.start()
+
+    @instrumentation.timed("grid.reload_images")
+    def reload_images(self, images, current_id=None):
+        """
+        Show a new image list after rows were removed, keeping the loaded icons
+        (they are keyed by image id) and making current_id the current image if
+        it is still there. The id must be read with current_image_id() before the
+        catalog changed: until this call the model's rows point at moved rows.
+        """
+        self.thumbnailer.reset()
+        self.image_model.set_images(images, keep_icons=True)
+        row = self.image_model.row_of(current_id) if current_id is not None else None
+        if row is not None:
+            self.select_row(row)
+        self._visible_timer.start()
+
+    def refresh_images(self, image_ids):
+        """
+        Re-create the thumbnails of images whose files changed on disk.
+        """
+        self.image_model.refresh_images(image_ids)
+        self._visible_timer.start()
+
+    def _visible_rows(self):
+        """
+        Return (first, last) rows currently in the viewport.
+        """
+        count = self.image_model.rowCount()
+        grid = self.gridSize()
+        rect = self.viewport().rect()
+        first_index = self.indexAt(rect.topLeft() + QPoint(grid.width() // 2, grid.height() // 2))
+        last_index = self.indexAt(rect.bottomRight() - QPoint(grid.width() // 2, grid.height() // 2))
+        per_row = max(1, rect.width() // max(1, grid.width()))
+        per_screen = per_row * (rect.height() // max(1, grid.height()) + 2)
+        first = first_index.row() if first_index.isValid() else 0
+        last = last_index.row() if last_index.isValid() else first + per_screen
+        return first, min(last, count - 1)
+
+    @instrumentation.timed("grid.request_visible")
+    def _request_visible_thumbnails(self):
+        """
+        Ask for thumbnails of on-screen rows first, then a prefetch margin around them.
+        Queued work for rows outside that window is cancelled by the thumbnailer.
+        """
+        model = self.image_model
+        count = model.rowCount()
+        if not count:
+            return
+        first, last = self._visible_rows()
+        margin = (last - first + 1) * PREFETCH_SCREENS
+        order = list(range(first, last + 1))
+        order += list(range(last + 1, min(count, last + 1 + margin)))
+        order += list(range(first - 1, max(-1, first - 1 - margin), -1))
+        rows = [(row, model.images[row].filepath) for row in order if not model.has_icon(row)]
+        visible = sum(1 for row in range(first, last + 1) if not model.has_icon(row))
+        self.thumbnailer.request(rows, visible)
 
-            pixmap = QPixmap(image_item.filepath)
-            if pixmap:
-                item.setIcon(QIcon(pixmap.scaled(128,128, Qt.KeepAspectRatio, Qt.SmoothTransformation)))
+    def _on_thumbnail_ready(self, row, image):
+        model = self.image_model
+        if row >= model.rowCount():
+            return
+        if image.isNull():
+            # Keep the placeholder, but do not ask for this file again until evicted
+            model.set_icon(row, model.placeholder_icon)
+        else:
+            model.set_icon(row, QIcon(QPixmap.fromImage(image)))
 
-            item.setText(", ".join(image_item.tags))
-            item.setData(Qt.UserRole, image_item) #thence we store the ImageItem object in the widgetItem - Roles - are just additional stored data, User is for custom data
+    def _on_perceptual_hash_ready(self, row, phash):
+        if row < self.image_model.rowCount():
+            self.perceptual_hash_ready.emit(self.image_model.images[row].id, phash)
 
-            self.addItem(item)
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._visible_timer.start()
 
     def get_selected_images(self) -> ImageItem:
-        return [item.data(Qt.UserRole) for item in self.selectedItems()]
-    
+        images = self.image_model.images
+        return [images[index.row()] for index in self.selectionModel().selectedIndexes()]
+
 
-    #don't work
     def update_image(self, image):
-        for i in range(self.count()):
-            item = self.item(i)
-            if item.data(Qt.UserRole).id == image.id:
-                item.setText(", ".join(image.tags))
-                item.setData(Qt.UserRole, image)
-                
+        self.image_model.update_image(image)
+
+    def update_images(self, image_ids):
+        self.image_model.update_images(image_ids)
+
+    def current_image_id(self):
+        """
+        Id of the current (focused) image, or None if there is none.
+        """
+        image = self.currentIndex().data(Qt.UserRole)
+        return image.id if image is not None else None
+
+    def current_row(self):
+        """
+        Row of the current (focused) image, or -1 if there is none.
+        """
+        index = self.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def select_row(self, row):
+        """
+        Make the row the only selected one and scroll to it.
+        Returns False if the row is out of range.
+        """
+        if not 0 <= row < self.image_model.rowCount():
+            return False
+        index = self.image_model.index(row)
+        self.selectionModel().setCurrentIndex(index, QItemSelectionModel.ClearAndSelect)
+        self.scrollTo(index)
+        return True
+
+    def filepaths_around(self, row, count):
+        """
+        Filepaths of up to count rows after and before row, nearest first.
+        """
+        images = self.image_model.images
+        paths = []
+        for offset in range(1, count + 1):
+            for neighbor in (row + offset, row - offset):
+                if 0 <= neighbor < len(images):
+                    paths.append(images[neighbor].filepath)
+        return paths
+
 
     def update_selected_item(self, ImageItem):
-        item = self.selectedItems()[0]
-        item.setText(", ".join(ImageItem.tags))
-        item.setData(Qt.UserRole, ImageItem)
+        self.image_model.update_image(ImageItem)
+
 
-    
     selection_changed = pyqtSignal(list)
 
-    def _on_selection_changed(self):
+    def _on_selection_changed(self, selected=None, deselected=None):
         self.selection_changed.emit(self.get_selected_images())
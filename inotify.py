@@ -0,0 +1,142 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+# Event masks from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Files are reported once fully written (close) or moved in, so half-copied files are not probed
+FILE_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+WATCH_MASK = FILE_EVENTS | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+READ_SIZE = 64 * 1024
+
+def _libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    if not all(hasattr(libc, name) for name in ('inotify_init1', 'inotify_add_watch', 'inotify_rm_watch')):
+        return None
+    return libc
+
+def available() -> bool:
+    return _libc() is not None
+
+class Inotify:
+    """
+    Minimal non-blocking inotify reader (Linux) reporting file paths, not folders.
+    Watches are not recursive: each watched folder reports its own files.
+    read_changes() drains the queue and returns
+    - paths: files created, rewritten, moved or deleted
+    - folders: watched folders that must be re-synced in full because the kernel
+      queue overflowed or the folder itself was deleted or moved
+    Raises OSError from the constructor if inotify is unavailable or the instance limit is hit.
+    """
+
+    def __init__(self):
+        self._libc = _libc()
+        if self._libc is None:
+            raise OSError("inotify is not available on this platform")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._folders: Dict[int, str] = {}  # watch descriptor -> folder
+        self._wds: Dict[str, int] = {}
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, folder: str) -> bool:
+        """
+        Watch a folder; returns False if it cannot be watched (missing, or the watch limit is hit).
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            return False
+        self._folders[wd] = folder
+        self._wds[folder] = wd
+        return True
+
+    def remove_watch(self, folder: str) -> None:
+        wd = self._wds.pop(folder, None)
+        if wd is not None:
+            self._folders.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def folders(self) -> List[str]:
+        return list(self._wds)
+
+    def read_changes(self) -> Tuple[Set[str], Set[str]]:
+        paths: Set[str] = set()
+        folders: Set[str] = set()
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            self._parse(data, paths, folders)
+        return paths, folders
+
+    def _parse(self, data: bytes, paths: Set[str], folders: Set[str]) -> None:
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; every watched folder has to be re-synced
+                folders.update(self._wds)
+                continue
+            folder = self._folders.get(wd)
+            if folder is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # The watch is gone; the caller falls back to polling this folder
+                self._folders.pop(wd, None)
+                self._wds.pop(folder, None)
+                if mask & IN_MOVE_SELF:
+                    # A moved folder keeps its kernel watch under the old name; drop it
+                    self._libc.inotify_rm_watch(self.fd, wd)
+                folders.add(folder)
+            elif name and not mask & IN_ISDIR:
+                paths.add(os.path.join(folder, os.fsdecode(name)))
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self._folders.clear()
+        self._wds.clear()
+
+def open_inotify() -> Optional[Inotify]:
+    """
+    Return an Inotify instance, or None when it cannot be used here.
+    """
+    if not available():
+        return None
+    try:
+        return Inotify()
+    except OSError as e:
+        print(f"File system notifications unavailable: {e}")
+        return None
@@ -0,0 +1,294 @@
+"""
+Switchable hot-path instrumentation: timers, counters, SQL statement counts per
+user action, and optional cProfile capture.
+
+Disabled by default. When disabled, timed() wrappers cost one flag check per
+call and timer()/action() return a shared no-op context manager. The SQL trace
+callback is only installed while enabled: with it, sqlite3 expands the SQL of every
+row of an executemany. A connection can only be changed from its own thread, so
+set_enabled() updates the calling thread's connections and background threads
+call SqlTracer.sync() before each job (see AsyncDatabase).
+
+Environment variables:
+    TG_TAGGER_INSTRUMENT=1         enable at startup
+    TG_TAGGER_PROFILE=out.pstats   profile the GUI thread for the whole session
+                                   (written on exit; implies instrumentation)
+    TG_TAGGER_STARTUP=1            print the duration of each startup phase to stderr;
+                                   TG_TAGGER_STARTUP=exit also quits once the library is loaded
+"""
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+ENV_ENABLE = 'TG_TAGGER_INSTRUMENT'
+ENV_PROFILE = 'TG_TAGGER_PROFILE'
+ENV_STARTUP = 'TG_TAGGER_STARTUP'
+# Most recent user actions kept for the stats panel and dumps
+MAX_ACTIONS = 200
+
+class _State:
+    enabled = False
+
+_state = _State()
+_lock = threading.Lock()
+# name -> [calls, total seconds, max seconds]
+_timers: Dict[str, List[float]] = {}
+_counters: Dict[str, int] = {}
+_actions: Deque[Dict] = deque(maxlen=MAX_ACTIONS)
+_sql_statements = [0]
+_profiler: Optional[cProfile.Profile] = None
+_tracers: 'weakref.WeakSet[SqlTracer]' = weakref.WeakSet()
+
+def enabled() -> bool:
+    return _state.enabled
+
+def set_enabled(value: bool) -> None:
+    """
+    Turn instrumentation on or off. SQL counting switches at once on connections
+    of the calling thread, and on other threads' connections at their next sync().
+    """
+    _state.enabled = value
+    thread = threading.get_ident()
+    with _lock:
+        tracers = [tracer for tracer in _tracers if tracer.thread == thread]
+    for tracer in tracers:
+        tracer.sync()
+
+class SqlTracer:
+    """
+    Counts SQL statements on one sqlite3 connection while instrumentation is enabled.
+    """
+
+    __slots__ = ('conn', 'thread', 'installed', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.thread = threading.get_ident()
+        self.installed = False
+
+    def sync(self) -> None:
+        """
+        Install or remove the trace callback to match enabled(); call from the connection's thread.
+        """
+        if self.installed != _state.enabled:
+            self.conn.set_trace_callback(_trace_sql if _state.enabled else None)
+            self.installed = _state.enabled
+
+def register_connection(conn) -> SqlTracer:
+    """
+    Count SQL statements run on a sqlite3 connection; call from the thread that opened it.
+    The caller keeps the returned tracer for as long as the connection is used.
+    """
+    tracer = SqlTracer(conn)
+    tracer.sync()
+    with _lock:
+        _tracers.add(tracer)
+    return tracer
+
+def _trace_sql(statement: str) -> None:
+    _sql_statements[0] += 1
+
+def record(name: str, seconds: float) -> None:
+    with _lock:
+        entry = _timers.get(name)
+        if entry is None:
+            _timers[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+def count(name: str, amount: int = 1) -> None:
+    if _state.enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+class _Timer:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+        return False
+
+class _NullContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _NullContext()
+
+def timer(name: str):
+    """
+    Context manager timing a block under `name`.
+    """
+    return _Timer(name) if _state.enabled else _NULL
+
+def timed(name: str) -> Callable:
+    """
+    Decorator timing every call of a function under `name`.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+class _Action:
+    __slots__ = ('name', 'started', 'sql_before')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.sql_before = _sql_statements[0]
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        record('action.' + self.name, elapsed)
+        _actions.append({"action": self.name, "at": time.time(), "ms": round(elapsed * 1000, 3),
+                         "sql": _sql_statements[0] - self.sql_before})
+        return False
+
+def action(name: str):
+    """
+    Context manager for one user action: records its duration and the number of SQL
+    statements executed meanwhile (on any connection, including background threads).
+    """
+    return _Action(name) if _state.enabled else _NULL
+
+def user_action(name: str) -> Callable:
+    """
+    Decorator recording every call of a function as a user action (see action()).
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            with _Action(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class PhaseTimer:
+    """
+    Times consecutive phases, e.g. of startup. mark(phase) ends the phase that
+    began at the previous mark (or at `started`, a time.perf_counter() value) and
+    records it as a timer named prefix + phase. With report=True each phase is
+    also printed to stderr with the time elapsed since `started`.
+    """
+
+    def __init__(self, prefix: str = 'startup.', started: Optional[float] = None, report: bool = False):
+        self.prefix = prefix
+        self.started = time.perf_counter() if started is None else started
+        self.report = report
+        self.phases: List[Dict] = []
+        self._last = self.started
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        record(self.prefix + phase, now - self._last)
+        entry = {"phase": phase, "ms": round((now - self._last) * 1000, 3),
+                 "total_ms": round((now - self.started) * 1000, 3)}
+        self.phases.append(entry)
+        self._last = now
+        if self.report:
+            print(f"{self.prefix + phase:32s} {entry['ms']:10.1f} ms   (total {entry['total_ms']:.1f} ms)",
+                  file=sys.stderr)
+
+def profiling() -> bool:
+    return _profiler is not None
+
+def start_profile() -> None:
+    """
+    Start cProfile on the calling thread (normally the GUI thread).
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+def stop_profile(path: str) -> Optional[str]:
+    """
+    Stop profiling and write pstats data to path. Returns the path, or None if not profiling.
+    """
+    global _profiler
+    if _profiler is None:
+        return None
+    _profiler.disable()
+    _profiler.dump_stats(path)
+    _profiler = None
+    return path
+
+def reset() -> None:
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _actions.clear()
+        _sql_statements[0] = 0
+
+def snapshot() -> Dict:
+    """
+    Return all collected data as plain, JSON-serialisable values.
+    """
+    with _lock:
+        timers = {name: {"calls": int(calls), "total_ms": round(total * 1000, 3),
+                         "avg_ms": round(total * 1000 / calls, 3), "max_ms": round(peak * 1000, 3)}
+                  for name, (calls, total, peak) in sorted(_timers.items())}
+        return {"enabled": _state.enabled, "sql_statements": _sql_statements[0],
+                "timers": timers, "counters": dict(sorted(_counters.items())), "actions": list(_actions)}
+
+def dump(path: str) -> str:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2)
+    return path
+
+def format_stats(max_actions: int = 20) -> str:
+    """
+    Plain-text summary for the stats panel: timers by total time, counters, recent actions.
+    """
+    data = snapshot()
+    lines = [f"SQL statements: {data['sql_statements']}", "",
+             f"{'timer':34s} {'calls':>8s} {'total ms':>10s} {'avg ms':>9s} {'max ms':>9s}"]
+    for name, entry in sorted(data["timers"].items(), key=lambda item: -item[1]["total_ms"]):
+        lines.append(f"{name:34s} {entry['calls']:8d} {entry['total_ms']:10.1f} "
+                     f"{entry['avg_ms']:9.3f} {entry['max_ms']:9.1f}")
+    if data["counters"]:
+        lines += ["", "counters"]
+        lines += [f"  {name:32s} {value:10d}" for name, value in data["counters"].items()]
+    if data["actions"]:
+        lines += ["", f"{'recent actions':34s} {'ms':>10s} {'sql':>8s}"]
+        for entry in data["actions"][-max_actions:]:
+            lines.append(f"  {entry['action']:32s} {entry['ms']:10.1f} {entry['sql']:8d}")
+    return "\n".join(lines)
+
+if os.environ.get(ENV_ENABLE) or os.environ.get(ENV_PROFILE):
+    set_enabled(True)
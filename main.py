@@ -1,6 +1,10 @@
+import os
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QAction, QFileDialog, QSplitter, QInputDialog, QMessageBox, QShortcut
-from PyQt5.QtCore import Qt, QSettings, qInstallMessageHandler
+import time
+# Момент запуска процесса (до импорта Qt); от него отсчитываются фазы старта
+STARTED = time.perf_counter()
+from PyQt5.QtWidgets import QApplication, QMainWindow, QAction, QFileDialog, QSplitter, QInputDialog, QMessageBox, QShortcut, QLabel, QLineEdit, QWidget, QVBoxLayout
+from PyQt5.QtCore import Qt, QSettings, QTimer, qInstallMessageHandler
 from PyQt5.QtGui import QKeySequence
 
 
@@ -15,32 +19,78 @@ qInstallMessageHandler(qt_message_handler)
 
 
 from database import DatabaseManager
+from db_worker import AsyncDatabase
 from image_widget import ImageGrid
+from thumbnail_cache import ThumbnailCache, cache_path_for
+from image_prefetcher import DecodedImageCache, ImagePrefetcher, DEFAULT_DECODED_CACHE_BYTES
 from detail_panel import DetailPanel
 from controller import AppController
+from folder_watcher import FolderWatcher
+from tag_index import TagQueryError
+from stats_panel import StatsPanel
+import instrumentation
 
 def main():
+    # Профилирование всей сессии, если задана переменная окружения TG_TAGGER_PROFILE
+    profile_path = os.environ.get(instrumentation.ENV_PROFILE)
+    if profile_path:
+        instrumentation.start_profile()
+    # Замер фаз запуска: TG_TAGGER_STARTUP=1 печатает их в stderr, =exit ещё и завершает программу после загрузки
+    startup_mode = os.environ.get(instrumentation.ENV_STARTUP, '')
+    startup = instrumentation.PhaseTimer(started=STARTED, report=bool(startup_mode))
+    startup.mark("imports")
     app = QApplication(sys.argv)
     # Настройки приложения (имя организации и приложения — произвольное)
     settings = QSettings("by Korashi", "ImageTagger")
-
-    # Инициализация компонентов
-    db = DatabaseManager(db_path="image_tags.db")
-    image_grid = ImageGrid()
-    detail_panel = DetailPanel()
-    detail_panel.set_tags_available(db.get_all_tags())
+    startup.mark("qt_init")
+
+    # Инициализация виджетов; база данных открывается после показа окна
+    thumbnail_cache = ThumbnailCache(cache_path_for("image_tags.db"))
+    image_grid = ImageGrid(thumbnail_cache=thumbnail_cache)
+    # Сначала останавливаем фоновые потоки миниатюр, потом закрываем кэш
+    app.aboutToQuit.connect(image_grid.thumbnailer.shutdown)
+    app.aboutToQuit.connect(thumbnail_cache.close)
+    # Кэш декодированных изображений для просмотра; бюджет памяти задаётся в настройках
+    decoded_cache_bytes = int(settings.value('decoded_cache_bytes', DEFAULT_DECODED_CACHE_BYTES))
+    image_cache = DecodedImageCache(max_bytes=decoded_cache_bytes)
+    detail_panel = DetailPanel(image_cache=image_cache)
+    prefetcher = ImagePrefetcher(image_cache)
+    app.aboutToQuit.connect(prefetcher.shutdown)
 
     # Собираем главное окно
     window = QMainWindow()
     window.setWindowTitle("Image Tagger")
     splitter = QSplitter(Qt.Horizontal)
-    splitter.addWidget(image_grid)
+    # Слева — строка фильтра по тегам над сеткой изображений
+    filter_edit = QLineEdit()
+    filter_edit.setPlaceholderText('Filter by tags, e.g. cat AND NOT (dog OR "hot dog"), UNTAGGED')
+    grid_panel = QWidget()
+    grid_layout = QVBoxLayout(grid_panel)
+    grid_layout.setContentsMargins(0, 0, 0, 0)
+    grid_layout.addWidget(filter_edit)
+    grid_layout.addWidget(image_grid)
+    splitter.addWidget(grid_panel)
     splitter.addWidget(detail_panel)
     window.setCentralWidget(splitter)
 
-    # Контроллер связывает всё вместе
-    controller = AppController(image_grid, detail_panel, db, settings)
-    controller.run()
+    # Статистика кэша миниатюр в строке состояния
+    def on_thumbnail_stats(hits, misses):
+        total = hits + misses
+        ratio = hits / total * 100 if total else 0
+        window.statusBar().showMessage(f"Thumbnails: {hits} cached, {misses} decoded ({ratio:.0f}% hit rate)")
+
+    image_grid.thumbnail_stats_changed.connect(on_thumbnail_stats)
+
+    # Статистика кэша декодированных изображений для просмотра
+    decode_stats_label = QLabel()
+    window.statusBar().addPermanentWidget(decode_stats_label)
+
+    def on_decode_stats(hits, misses, average_ms):
+        total = hits + misses
+        ratio = hits / total * 100 if total else 0
+        decode_stats_label.setText(f"Viewer: {ratio:.0f}% cache hits, {average_ms:.0f} ms per decode")
+
+    detail_panel.decode_stats_changed.connect(on_decode_stats)
 
     # Меню для добавления папки
     menubar = window.menuBar()
@@ -59,33 +109,121 @@ def main():
     def on_add_folder():
         folder = QFileDialog.getExistingDirectory(window, "Select Folder")
         if folder:
-            # Сохраняем новый путь и добавляем файлы в БД
-            controller.folders.append(folder)
-            controller.save_folders_to_settings()
-            db.add_folder(folder)
-            # Перезагружаем список изображений
-            controller.images = db.get_all_images()
-            image_grid.set_images(controller.images)
+            # Сохраняем новый путь и добавляем файлы в БД (в фоновом потоке записи)
+            controller.add_folder(folder)
 
     add_folder_action.triggered.connect(on_add_folder)
 
     def on_add_tag():
         text, ok = QInputDialog.getText(window, "New Tag", "Enter tag name:")
         if ok and text.strip():
-            try:
-                tag = db.get_or_create_tag(text.strip())
-                # Обновляем кнопки тегов в панели деталей
-                detail_panel.set_tags_available(db.get_all_tags())
-            except Exception as e:
-                QMessageBox.warning(window, "Error", f"Failed to add tag: {e}")
+            # Тег создаётся в потоке записи БД; кнопки тегов обновит контроллер
+            controller.add_tag(
+                text.strip(),
+                on_error=lambda e: QMessageBox.warning(window, "Error", f"Failed to add tag: {e}")
+            )
 
 
     add_tag_action.triggered.connect(on_add_tag)
 
+    # Дубликаты определяются по хешу содержимого; теги объединяются внутри каждой группы
+    merge_duplicates_action = QAction("Merge Tags Across Duplicates", window)
+    tags_menu.addAction(merge_duplicates_action)
+
+    def on_merge_duplicates():
+        window.statusBar().showMessage("Hashing images to find duplicates...")
+        controller.merge_duplicate_tags(
+            lambda added: window.statusBar().showMessage(f"Duplicates: {added} tags merged"),
+            lambda error: window.statusBar().showMessage(f"Duplicates: merge failed: {error}")
+        )
+
+    merge_duplicates_action.triggered.connect(on_merge_duplicates)
+
+    # Поиск похожих изображений (по перцептивному хешу миниатюр)
+    def on_find_similar(image_id):
+        controller.find_similar(image_id, lambda found: window.statusBar().showMessage(
+            f"Similar images: {found} found; press Enter in the filter box to go back"))
+
+    detail_panel.find_similar_requested.connect(on_find_similar)
+
+    def on_filter():
+        try:
+            controller.apply_filter(filter_edit.text())
+        except TagQueryError as e:
+            window.statusBar().showMessage(f"Invalid filter: {e}")
+
+    filter_edit.returnPressed.connect(on_filter)
+
+    # Меню отладки: счётчики и таймеры, профилирование GUI-потока, окно статистики
+    debug_menu = menubar.addMenu("Debug")
+    instrument_action = QAction("Enable Instrumentation", window, checkable=True)
+    instrument_action.setChecked(instrumentation.enabled())
+    instrument_action.toggled.connect(instrumentation.set_enabled)
+    debug_menu.addAction(instrument_action)
+
+    profile_action = QAction("Profile GUI Thread", window, checkable=True)
+    profile_action.setChecked(instrumentation.profiling())
+    debug_menu.addAction(profile_action)
+
+    def on_profile_toggled(checked):
+        if checked:
+            instrumentation.start_profile()
+            window.statusBar().showMessage("Profiling...")
+            return
+        path = instrumentation.stop_profile(profile_path or time.strftime("profile-%Y%m%d-%H%M%S.pstats"))
+        if path:
+            window.statusBar().showMessage(f"Profile written to {os.path.abspath(path)}")
+
+    profile_action.toggled.connect(on_profile_toggled)
+
+    stats_panel = StatsPanel(window)
+    stats_action = QAction("Show Stats...", window)
+    stats_action.triggered.connect(stats_panel.show)
+    debug_menu.addAction(stats_action)
+
+    if profile_path:
+        app.aboutToQuit.connect(lambda: instrumentation.stop_profile(profile_path))
+
+    # Показываем окно сразу, до открытия БД и загрузки изображений
+    window.show()
+    window.statusBar().showMessage("Loading library...")
+    app.processEvents()
+    startup.mark("window_shown")
+
+    db = DatabaseManager(db_path="image_tags.db")
+    # Поток записи и пул читающих соединений для работы с БД вне GUI-потока
+    async_db = AsyncDatabase(db_path="image_tags.db")
+    detail_panel.set_tags_available(db.get_all_tags())
+    startup.mark("db_open")
+
+    # Слежение за папками: новые и изменённые файлы добавляются без полного пересканирования
+    folder_watcher = None
+    if settings.value('watch_folders', True, type=bool):
+        folder_watcher = FolderWatcher(poll_only=settings.value('watch_poll_only', False, type=bool))
+        app.aboutToQuit.connect(folder_watcher.close)
+
+    # Контроллер связывает всё вместе
+    controller = AppController(image_grid, detail_panel, db, settings, prefetcher, async_db, folder_watcher,
+                               startup_timer=startup)
+
+    # Первая страница показывается сразу, остальные подгружаются в фоне
+    def on_startup_done():
+        window.statusBar().showMessage(f"Loaded {len(controller.images)} images")
+        if startup_mode == 'exit':
+            # Через цикл событий: загрузка может завершиться ещё до app.exec_()
+            QTimer.singleShot(0, app.quit)
+
+    controller.on_startup_done = on_startup_done
+    controller.run()
+    # Отложенные изменения тегов записываются в БД при закрытии
+    app.aboutToQuit.connect(controller.flush_tag_changes)
+    app.aboutToQuit.connect(controller.flush_perceptual_hashes)
+    # Дожидаемся фоновых записей в БД перед выходом
+    app.aboutToQuit.connect(async_db.close)
+
     prev_sc.activated.connect(controller.select_previous_image)
     next_sc.activated.connect(controller.select_next_image)
 
-    window.show()
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
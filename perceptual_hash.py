@@ -0,0 +1,121 @@
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# dHash compares horizontally adjacent pixels of a 9x8 grayscale image: 8 x 8 = 64 bits
+DHASH_WIDTH = 9
+DHASH_HEIGHT = 8
+HASH_BITS = 64
+# Hamming distance up to which two images count as similar
+DEFAULT_SIMILAR_DISTANCE = 10
+# The multi-index splits each hash into this many chunks, each with its own lookup table
+INDEX_CHUNKS = 4
+
+_CHUNK_BITS = HASH_BITS // INDEX_CHUNKS
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+
+def dhash_from_gray(pixels: bytes, stride: int = DHASH_WIDTH) -> int:
+    """
+    Compute a 64-bit difference hash from 9x8 grayscale pixels, row by row with the
+    given stride. Bit n is set when a pixel is brighter than its right neighbor.
+    """
+    value = 0
+    for y in range(DHASH_HEIGHT):
+        row = pixels[y * stride:y * stride + DHASH_WIDTH]
+        for x in range(DHASH_WIDTH - 1):
+            value = (value << 1) | (row[x] > row[x + 1])
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def to_signed(value: int) -> int:
+    """
+    Map an unsigned 64-bit hash into SQLite's signed INTEGER range.
+    """
+    return value - (1 << HASH_BITS) if value & _SIGN_BIT else value
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << HASH_BITS) - 1)
+
+def _chunks(value: int) -> List[int]:
+    return [(value >> (i * _CHUNK_BITS)) & _CHUNK_MASK for i in range(INDEX_CHUNKS)]
+
+def _variants(chunk: int, distance: int) -> Iterable[int]:
+    """
+    Yield every chunk value within `distance` bit flips of chunk.
+    """
+    for flips in range(distance + 1):
+        for positions in combinations(range(_CHUNK_BITS), flips):
+            variant = chunk
+            for position in positions:
+                variant ^= 1 << position
+            yield variant
+
+class PerceptualHashIndex:
+    """
+    Multi-index hashing over 64-bit perceptual hashes for Hamming-radius search.
+    Each hash is split into INDEX_CHUNKS chunks, and every chunk has a table
+    from chunk value to image ids. If two hashes are within distance r, then by the
+    pigeonhole principle some chunk differs in at most r // INDEX_CHUNKS bits.
+    A search therefore probes only those near chunk values and checks the full
+    distance for the few candidates found, instead of comparing against every image.
+    """
+
+    def __init__(self):
+        self.hashes: Dict[int, int] = {}  # image id -> hash
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(INDEX_CHUNKS)]
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[int, int]]) -> 'PerceptualHashIndex':
+        index = cls()
+        for image_id, value in pairs:
+            index.add(image_id, value)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, image_id: int) -> bool:
+        return image_id in self.hashes
+
+    def get(self, image_id: int) -> Optional[int]:
+        return self.hashes.get(image_id)
+
+    def add(self, image_id: int, value: int) -> None:
+        if image_id in self.hashes:
+            self.remove(image_id)
+        self.hashes[image_id] = value
+        for table, chunk in zip(self._tables, _chunks(value)):
+            table.setdefault(chunk, []).append(image_id)
+
+    def remove(self, image_id: int) -> None:
+        value = self.hashes.pop(image_id, None)
+        if value is None:
+            return
+        for table, chunk in zip(self._tables, _chunks(value)):
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.remove(image_id)
+                if not bucket:
+                    del table[chunk]
+
+    def search(self, value: int, max_distance: int = DEFAULT_SIMILAR_DISTANCE) -> List[Tuple[int, int]]:
+        """
+        Return (distance, image_id) for every stored hash within max_distance, nearest first.
+        """
+        chunk_distance = max_distance // INDEX_CHUNKS
+        hashes = self.hashes
+        seen = set()
+        found = []
+        for table, chunk in zip(self._tables, _chunks(value)):
+            for variant in _variants(chunk, chunk_distance):
+                for image_id in table.get(variant, ()):
+                    if image_id in seen:
+                        continue
+                    seen.add(image_id)
+                    distance = (hashes[image_id] ^ value).bit_count()
+                    if distance <= max_distance:
+                        found.append((distance, image_id))
+        found.sort()
+        return found
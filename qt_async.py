@@ -0,0 +1,31 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+class FutureWatcher(QObject):
+    """
+    Delivers concurrent.futures results to callbacks on the GUI thread.
+    Done-callbacks fire on the worker thread; emitting a signal owned by this
+    object queues the call back to the thread the watcher lives in.
+    """
+
+    _done = pyqtSignal(object, object)  # future, (on_result, on_error)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._done.connect(self._on_done)
+
+    def watch(self, future, on_result=None, on_error=None):
+        """
+        Call on_result(result) or on_error(exception) on the GUI thread when future completes.
+        """
+        future.add_done_callback(lambda f: self._done.emit(f, (on_result, on_error)))
+
+    def _on_done(self, future, callbacks):
+        on_result, on_error = callbacks
+        error = future.exception()
+        if error is None:
+            if on_result:
+                on_result(future.result())
+        elif on_error:
+            on_error(error)
+        else:
+            print(f"Background database task failed: {error}")
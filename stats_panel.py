@@ -0,0 +1,65 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QPushButton, QFileDialog
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtCore import QTimer
+
+import instrumentation
+
+# How often the panel re-reads the collected numbers while it is open
+REFRESH_INTERVAL_MS = 1000
+
+class StatsPanel(QDialog):
+    """
+    Small non-modal window showing instrumentation timers, counters and recent actions.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance Stats")
+        self.resize(720, 480)
+        layout = QVBoxLayout(self)
+
+        self.text = QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(self.text)
+
+        buttons = QHBoxLayout()
+        reset_button = QPushButton("Reset", self)
+        reset_button.clicked.connect(self._on_reset)
+        dump_button = QPushButton("Dump to File...", self)
+        dump_button.clicked.connect(self._on_dump)
+        close_button = QPushButton("Close", self)
+        close_button.clicked.connect(self.close)
+        buttons.addWidget(reset_button)
+        buttons.addWidget(dump_button)
+        buttons.addStretch()
+        buttons.addWidget(close_button)
+        layout.addLayout(buttons)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(REFRESH_INTERVAL_MS)
+        self._timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        if not instrumentation.enabled():
+            self.text.setPlainText("Instrumentation is off (Debug > Enable Instrumentation).")
+            return
+        self.text.setPlainText(instrumentation.format_stats())
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self._timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._timer.stop()
+
+    def _on_reset(self):
+        instrumentation.reset()
+        self.refresh()
+
+    def _on_dump(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Dump Stats", "stats.json", "JSON (*.json)")
+        if path:
+            instrumentation.dump(path)
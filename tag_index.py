@@ -0,0 +1,251 @@
+import re
+from array import array
+from itertools import compress
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class TagQueryError(ValueError):
+    """
+    Raised for a malformed tag query.
+    """
+
+# Query tokens: parentheses, quoted names, or bare words
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+_ONE_RE = re.compile('1')
+# bin() digits to byte values, so a bitmap becomes one 0/1 byte per bit
+_BIT_BYTES = bytes.maketrans(b'01', b'\x00\x01')
+
+def _bitmap(ids: Iterable[int]) -> int:
+    """
+    Build a bitmap (bit n set for id n) in linear time via a bytearray.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for image_id in ids:
+        buffer[image_id >> 3] |= 1 << (image_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+def bitmap_ids(bitmap: int) -> List[int]:
+    """
+    Return the ids set in a bitmap in ascending order.
+    """
+    if not bitmap:
+        return []
+    # bin() and the regex scan both run in C; reversed so index == bit number
+    bits = bin(bitmap)[:1:-1]
+    return [match.start() for match in _ONE_RE.finditer(bits)]
+
+def _bit_bytes(bitmap: int, size: int) -> bytes:
+    """
+    One byte per bit (byte n is 1 if bit n is set), zero-padded to size bytes.
+    """
+    bits = bin(bitmap)[:1:-1].encode('ascii').translate(_BIT_BYTES)
+    return bits + bytes(size - len(bits))
+
+def bitmap_rows(bitmap: int, present: int, present_bytes: Optional[bytes] = None) -> array:
+    """
+    Return the ranks, among the bits set in `present`, of the bits also set in
+    `bitmap`, ascending. With `present` holding the ids of an ImageCatalog these
+    are the catalog rows of the matching images. present_bytes may pass in
+    _bit_bytes(present, present.bit_length()) kept from an earlier call.
+    Everything but making one int per matching row runs in C; that part
+    (about 50 ms for 400k matches) is what remains of the cost.
+    """
+    bitmap &= present
+    rows = array('q')
+    if not bitmap:
+        return rows
+    size = present.bit_length()
+    if present_bytes is None:
+        present_bytes = _bit_bytes(present, size)
+    # One selector byte per present id, in id order, i.e. per catalog row
+    selectors = compress(_bit_bytes(bitmap, size), present_bytes)
+    rows.fromlist(list(compress(range(size), selectors)))
+    return rows
+
+class TagIndex:
+    """
+    In-memory inverted index from tag to the images carrying it.
+    Each posting list is a bitmap stored as a Python int (bit n set for image id n),
+    so AND/OR/NOT over whole tags are single big-integer operations.
+
+    Query syntax: tag names combined with AND, OR, NOT and parentheses;
+    adjacent terms mean AND. Names with spaces go in double quotes.
+    UNTAGGED matches images without any tag. Unknown tags match nothing.
+    Example: cat AND NOT (dog OR "hot dog")
+    """
+
+    def __init__(self):
+        self.all_images = 0
+        # (all_images, its _bit_bytes) from the last query_rows(); all_images is
+        # replaced, never changed in place, so identity tells whether it is current
+        self._present_bytes: Optional[Tuple[int, bytes]] = None
+        self._postings: Dict[int, int] = {}  # tag_id -> bitmap of image ids
+        self._tag_ids: Dict[str, int] = {}  # tag name -> tag_id
+        self._tag_ids_lower: Dict[str, int] = {}  # lower-case fallback for case-insensitive lookup
+
+    @classmethod
+    def from_catalog(cls, catalog, tags) -> 'TagIndex':
+        """
+        Build the index from an ImageCatalog already in memory, without querying the database.
+        """
+        index = cls()
+        index.set_tags(tags)
+        index.all_images = _bitmap(catalog.ids)
+        per_tag: Dict[int, List[int]] = {}
+        for image_id, tag_id in catalog.image_tag_pairs():
+            per_tag.setdefault(tag_id, []).append(image_id)
+        index._postings = {tag_id: _bitmap(ids) for tag_id, ids in per_tag.items()}
+        return index
+
+    def set_tags(self, tags) -> None:
+        """
+        Register the known TagItems so queries can refer to them by name.
+        """
+        self._tag_ids = {tag.name: tag.id for tag in tags}
+        self._tag_ids_lower = {tag.name.lower(): tag.id for tag in tags}
+
+    def add_images(self, image_ids: Iterable[int]) -> None:
+        self.all_images |= _bitmap(image_ids)
+
+    def add_catalog(self, catalog, rows: Optional[Iterable[int]] = None) -> None:
+        """
+        Add images of an ImageCatalog (all, or the given rows) with their tags.
+        Each tag's bitmap is merged once, not once per image, so adding a large
+        page costs about the same as building it with from_catalog.
+        """
+        rows = range(len(catalog)) if rows is None else rows
+        ids = catalog.ids
+        per_tag: Dict[int, List[int]] = {}
+        added = []
+        for row in rows:
+            image_id = ids[row]
+            added.append(image_id)
+            for tag_id in catalog.tag_ids(row):
+                per_tag.setdefault(tag_id, []).append(image_id)
+        self.all_images |= _bitmap(added)
+        for tag_id, tagged in per_tag.items():
+            self._postings[tag_id] = self._postings.get(tag_id, 0) | _bitmap(tagged)
+
+    def remove_images(self, image_ids: Iterable[int]) -> None:
+        mask = ~_bitmap(image_ids)
+        self.all_images &= mask
+        for tag_id in self._postings:
+            self._postings[tag_id] &= mask
+
+    def set_tag(self, image_id: int, tag_id: int, value: bool) -> None:
+        bit = 1 << image_id
+        if value:
+            self._postings[tag_id] = self._postings.get(tag_id, 0) | bit
+        else:
+            self._postings[tag_id] = self._postings.get(tag_id, 0) & ~bit
+
+    def set_tag_for_images(self, image_ids: Iterable[int], tag_id: int, value: bool) -> None:
+        mask = _bitmap(image_ids)
+        if value:
+            self._postings[tag_id] = self._postings.get(tag_id, 0) | mask
+        else:
+            self._postings[tag_id] = self._postings.get(tag_id, 0) & ~mask
+
+    def images_with_tag(self, tag_id: int) -> int:
+        return self._postings.get(tag_id, 0)
+
+    def untagged(self) -> int:
+        tagged = 0
+        for bitmap in self._postings.values():
+            tagged |= bitmap
+        return self.all_images & ~tagged
+
+    def query(self, text: str) -> int:
+        """
+        Evaluate a query and return the bitmap of matching image ids.
+        Raises TagQueryError for malformed queries.
+        """
+        tokens = self._tokenize(text)
+        if not tokens:
+            return self.all_images
+        result, pos = self._parse_or(tokens, 0)
+        if pos != len(tokens):
+            raise TagQueryError(f"Unexpected '{tokens[pos][1]}' in tag query")
+        return result & self.all_images
+
+    def query_ids(self, text: str, image_ids: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        Return matching ids in ascending order, optionally only among image_ids.
+        """
+        result = self.query(text)
+        if image_ids is not None:
+            result &= _bitmap(image_ids)
+        return bitmap_ids(result)
+
+    def query_rows(self, text: str) -> array:
+        """
+        Return the matching images as ascending ImageCatalog rows, for an index
+        built from that catalog and kept in step with it (see bitmap_rows).
+        """
+        present = self.all_images
+        cached = self._present_bytes
+        if cached is None or cached[0] is not present:
+            cached = self._present_bytes = (present, _bit_bytes(present, present.bit_length()))
+        return bitmap_rows(self.query(text), present, cached[1])
+
+    @staticmethod
+    def _tokenize(text: str) -> List[Tuple[str, str]]:
+        tokens = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            match = _TOKEN_RE.match(text, pos)
+            if not match or match.end() == pos:
+                raise TagQueryError(f"Cannot parse tag query near '{text[pos:]}'")
+            pos = match.end()
+            if match.group(1):
+                tokens.append(('(', '('))
+            elif match.group(2):
+                tokens.append((')', ')'))
+            elif match.group(3) is not None:
+                tokens.append(('name', match.group(3)))
+            else:
+                word = match.group(4)
+                upper = word.upper()
+                if upper in ('AND', 'OR', 'NOT', 'UNTAGGED'):
+                    tokens.append((upper, word))
+                else:
+                    tokens.append(('name', word))
+        return tokens
+
+    def _parse_or(self, tokens, pos):
+        result, pos = self._parse_and(tokens, pos)
+        while pos < len(tokens) and tokens[pos][0] == 'OR':
+            right, pos = self._parse_and(tokens, pos + 1)
+            result |= right
+        return result, pos
+
+    def _parse_and(self, tokens, pos):
+        result, pos = self._parse_not(tokens, pos)
+        while pos < len(tokens) and tokens[pos][0] not in ('OR', ')'):
+            if tokens[pos][0] == 'AND':
+                pos += 1
+            right, pos = self._parse_not(tokens, pos)
+            result &= right
+        return result, pos
+
+    def _parse_not(self, tokens, pos):
+        if pos >= len(tokens):
+            raise TagQueryError("Tag query ends unexpectedly")
+        kind, value = tokens[pos]
+        if kind == 'NOT':
+            operand, pos = self._parse_not(tokens, pos + 1)
+            return self.all_images & ~operand, pos
+        if kind == '(':
+            result, pos = self._parse_or(tokens, pos + 1)
+            if pos >= len(tokens) or tokens[pos][0] != ')':
+                raise TagQueryError("Missing ')' in tag query")
+            return result, pos + 1
+        if kind == 'UNTAGGED':
+            return self.untagged(), pos + 1
+        if kind == 'name':
+            tag_id: Optional[int] = self._tag_ids.get(value, self._tag_ids_lower.get(value.lower()))
+            return (self._postings.get(tag_id, 0) if tag_id is not None else 0), pos + 1
+        raise TagQueryError(f"Unexpected '{value}' in tag query")
@@ -0,0 +1,93 @@
+from typing import Dict, List, Optional, Tuple
+
+class TagWriteQueue:
+    """
+    Write-behind buffer for image/tag changes.
+    Changes are coalesced per (image_id, tag_id): toggling a tag and toggling it
+    back before a flush cancels out, so only net changes reach the database.
+    """
+
+    def __init__(self):
+        # (image_id, tag_id) -> value to write
+        self._pending: Dict[Tuple[int, int], bool] = {}
+        # (image_id, tag_id) -> value the database holds for pending keys
+        self._stored: Dict[Tuple[int, int], bool] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        """
+        True if a change for (image_id, tag_id) is waiting to be written.
+        """
+        return key in self._pending
+
+    def record(self, image_id: int, tag_id: int, value: bool, previous: Optional[bool] = None) -> None:
+        """
+        Queue a change. previous is the state before this change if known;
+        by default the change is taken to be a toggle (previous = not value).
+        """
+        key = (image_id, tag_id)
+        if key not in self._pending:
+            stored = (not value) if previous is None else previous
+            if stored == value:
+                return
+            self._stored[key] = stored
+            self._pending[key] = value
+        elif self._stored[key] == value:
+            # Back to the state the database already has
+            del self._pending[key]
+            del self._stored[key]
+        else:
+            self._pending[key] = value
+
+    def changes(self) -> List[Tuple[int, int, bool]]:
+        return [(image_id, tag_id, value) for (image_id, tag_id), value in self._pending.items()]
+
+    def take(self) -> List[Tuple[int, int, bool, bool]]:
+        """
+        Remove and return all pending changes as (image_id, tag_id, value, stored),
+        for writing elsewhere. Pass them to restore() if that write fails.
+        """
+        taken = [(image_id, tag_id, value, self._stored[(image_id, tag_id)])
+                 for (image_id, tag_id), value in self._pending.items()]
+        self._pending.clear()
+        self._stored.clear()
+        return taken
+
+    def restore(self, taken: List[Tuple[int, int, bool, bool]]) -> None:
+        """
+        Put back changes from take() whose write failed; edits made since then take precedence.
+        """
+        for image_id, tag_id, value, stored in taken:
+            key = (image_id, tag_id)
+            if key in self._pending:
+                value = self._pending[key]
+            if value == stored:
+                self._pending.pop(key, None)
+                self._stored.pop(key, None)
+            else:
+                self._pending[key] = value
+                self._stored[key] = stored
+
+    def discard_images(self, image_ids) -> None:
+        """
+        Drop pending changes for images that no longer exist.
+        """
+        removed = set(image_ids)
+        for key in [key for key in self._pending if key[0] in removed]:
+            del self._pending[key]
+            del self._stored[key]
+
+    def flush(self, db_manager) -> bool:
+        """
+        Write all pending changes in one transaction.
+        On failure the changes stay queued for the next attempt.
+        """
+        if not self._pending:
+            return True
+        if not db_manager.apply_tag_changes(self.changes()):
+            return False
+        self._pending.clear()
+        self._stored.clear()
+        return True
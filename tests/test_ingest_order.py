@@ -0,0 +1,95 @@
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("PyQt5.QtCore")
+from PyQt5.QtCore import QCoreApplication
+
+from controller import AppController
+from database import DatabaseManager, IngestReport
+
+class FakeSettings:
+    def value(self, key, default=None, type=None):
+        return default
+
+class FakeGrid:
+    def __init__(self):
+        self.images = None
+
+    def set_images(self, images):
+        self.images = images
+
+    def reload_images(self, images, current_id=None):
+        self.images = images
+
+    def append_images(self, images):
+        pass
+
+    def update_images(self, image_ids):
+        pass
+
+    def refresh_images(self, image_ids):
+        pass
+
+    def current_image_id(self):
+        return None
+
+class FakePanel:
+    def forget_images(self, image_ids):
+        pass
+
+    def refresh_tags(self):
+        pass
+
+class ManualReads:
+    """
+    Stands in for AsyncDatabase: catalog reads stay pending until the test completes them.
+    """
+
+    def __init__(self):
+        self.reads = []
+
+    def get_image_catalog(self, after_id=0, image_ids=None, limit=None):
+        future = Future()
+        self.reads.append((future, after_id))
+        return future
+
+@pytest.fixture
+def controller(tmp_path):
+    QCoreApplication.instance() or QCoreApplication([])
+    db = DatabaseManager(str(tmp_path / 'image_tags.db'))
+    db.conn.executemany("INSERT INTO images (filepath, width, height) VALUES (?, 1, 1)",
+                        [(f"/photos/img{index}.jpg",) for index in range(1, 4)])
+    db.conn.commit()
+    controller = AppController(FakeGrid(), FakePanel(), db, FakeSettings(), async_db=ManualReads())
+    controller.set_images(db.get_image_catalog(image_ids=[1]))
+    yield controller
+    db.conn.close()
+
+def test_reads_finishing_in_reverse_cannot_reorder_appends(controller):
+    db, reads = controller.db_manager, controller.async_db.reads
+    controller.apply_ingest_report(IngestReport(added=1, added_ids=[2]))
+    controller.apply_ingest_report(IngestReport(added=1, added_ids=[3]))
+    # The second report's read is only started once the first one's has been applied,
+    # so image 3 can never be appended before image 2
+    assert len(reads) == 1
+
+    first, after_id = reads[0]
+    first.set_result(db.get_image_catalog(image_ids=[2]))
+    assert len(reads) == 2
+    second, after_id = reads[1]
+    second.set_result(db.get_image_catalog(after_id=after_id))
+
+    assert list(controller.images.ids) == [1, 2, 3]
+    assert not controller._report_queue
+
+def test_removal_after_append_leaves_no_ghost(controller):
+    db, reads = controller.db_manager, controller.async_db.reads
+    controller.apply_ingest_report(IngestReport(added=1, added_ids=[2]))
+    controller.apply_ingest_report(IngestReport(removed=1, removed_ids=[2]))
+    # The read was taken before the removal was committed and still holds image 2
+    future, after_id = reads[0]
+    future.set_result(db.get_image_catalog(image_ids=[2]))
+
+    assert list(controller.images.ids) == [1]
+    assert not controller._report_queue
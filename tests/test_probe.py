@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from benchmarks.synthetic_library import generate
+from database import DatabaseManager
+from image_probe import get_image_size
+
+CORPUS_IMAGES = 300
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('corpus')
+    manifest = generate(str(folder), images=CORPUS_IMAGES, tags=0, seed=3)
+    return str(folder), manifest
+
+def _ingest(folder, db_path, probe_workers):
+    db = DatabaseManager(db_path, probe_workers=probe_workers)
+    try:
+        report = db.add_folder(folder, recursive=True)
+        images = {os.path.relpath(image.filepath, folder): (image.width, image.height)
+                  for image in db.get_all_images()}
+    finally:
+        db.conn.close()
+    return report, images
+
+def test_corpus_covers_formats(corpus):
+    _, manifest = corpus
+    extensions = {os.path.splitext(path)[1] for path in manifest['files']}
+    assert {'.png', '.jpg', '.gif', '.bmp'} <= extensions
+
+def test_parallel_probe_matches_serial(corpus, tmp_path):
+    folder, manifest = corpus
+    serial_report, serial = _ingest(folder, str(tmp_path / 'serial.db'), probe_workers=1)
+    parallel_report, parallel = _ingest(folder, str(tmp_path / 'parallel.db'), probe_workers=8)
+
+    assert serial_report.added == parallel_report.added == len(manifest['files'])
+    assert serial_report.failed == parallel_report.failed == 0
+    assert parallel == serial
+    assert all(width > 0 and height > 0 for width, height in serial.values())
+
+def test_ingested_sizes_match_probe(corpus, tmp_path):
+    folder, _ = corpus
+    _, parallel = _ingest(folder, str(tmp_path / 'parallel.db'), probe_workers=8)
+    for path, size in parallel.items():
+        assert size == get_image_size(os.path.join(folder, path)), path
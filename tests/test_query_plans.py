@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from database import DatabaseManager
+
+# Schema of image_tags.db files written before versioned migrations (user_version 0)
+UNVERSIONED_SCHEMA = """
+    CREATE TABLE images (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filepath TEXT UNIQUE,
+        width INTEGER,
+        height INTEGER
+    );
+    CREATE TABLE tags (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE
+    );
+    CREATE TABLE image_tags (
+        image_id INTEGER,
+        tag_id INTEGER,
+        PRIMARY KEY (image_id, tag_id),
+        FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE,
+        FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+    );
+    CREATE TABLE groups (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE
+    );
+    CREATE TABLE group_images (
+        group_id INTEGER,
+        image_id INTEGER,
+        PRIMARY KEY (group_id, image_id),
+        FOREIGN KEY (group_id) REFERENCES groups(id) ON DELETE CASCADE,
+        FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE
+    );
+"""
+
+HOT_QUERIES = {
+    "images_by_tag": ("SELECT image_id FROM image_tags WHERE tag_id = ?", (1,)),
+    "tags_of_image": ("""
+        SELECT t.name
+        FROM tags t
+        JOIN image_tags it ON t.id = it.tag_id
+        WHERE it.image_id = ?
+    """, (1,)),
+    "folder_range": ("SELECT id, filepath, mtime, size FROM images WHERE filepath >= ? AND filepath < ?",
+                     ("/photos/", "/photos0")),
+    "groups_of_image": ("SELECT group_id FROM group_images WHERE image_id = ?", (1,)),
+    "tag_by_name": ("SELECT id, name FROM tags WHERE name = ?", ("cat",)),
+}
+
+@pytest.fixture
+def upgraded_db(tmp_path):
+    db_path = str(tmp_path / 'image_tags.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript(UNVERSIONED_SCHEMA)
+    conn.executemany("INSERT INTO images (filepath, width, height) VALUES (?, 1, 1)",
+                     [(f"/photos/img{index}.jpg",) for index in range(100)])
+    conn.executemany("INSERT INTO tags (name) VALUES (?)", [(f"tag{index}",) for index in range(10)])
+    conn.executemany("INSERT INTO image_tags VALUES (?, ?)",
+                     [(image_id, tag_id) for image_id in range(1, 101) for tag_id in range(1, 11, 3)])
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(db_path)
+    yield db
+    db.conn.close()
+
+def test_unversioned_database_is_upgraded(upgraded_db):
+    version = upgraded_db.conn.execute("PRAGMA user_version").fetchone()[0]
+    assert version == upgraded_db._migrations()[-1][0]
+    columns = {row[1] for row in upgraded_db.conn.execute("PRAGMA table_info(images)")}
+    assert {"mtime", "size", "content_hash", "perceptual_hash"} <= columns
+    assert upgraded_db.conn.execute("SELECT COUNT(*) FROM image_tags").fetchone()[0] == 400
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_does_not_scan(upgraded_db, name):
+    sql, params = HOT_QUERIES[name]
+    plan = [row[3] for row in upgraded_db.conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    assert plan
+    assert not [step for step in plan if step.startswith("SCAN")], plan
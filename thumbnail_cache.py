@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+# Default cap for stored thumbnail bytes
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def cache_path_for(db_path: str) -> str:
+    """
+    Return the thumbnail cache location that sits next to the given tags database.
+    """
+    folder = os.path.dirname(os.path.abspath(db_path))
+    return os.path.join(folder, "thumbnails.db")
+
+class ThumbnailCache:
+    """
+    Persistent, content-addressed store of encoded thumbnails in a SQLite blob table.
+    Entries are keyed by file path, mtime, file size and thumbnail size, so an
+    edited or replaced file simply misses. Once the stored bytes exceed
+    max_bytes, least recently used entries are evicted on flush().
+    Safe to share between thumbnail worker threads; access is serialized by a lock.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # key -> last use time, written to the table in one batch by flush()
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                key TEXT PRIMARY KEY,
+                data BLOB,
+                bytes INTEGER,
+                last_used REAL
+            )
+        """)
+        # Covers bytes too, so the size total below reads the small index instead of every blob page
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_thumbnails_usage ON thumbnails(last_used, bytes)")
+        self.conn.execute("DROP INDEX IF EXISTS idx_thumbnails_last_used")
+        self.conn.commit()
+        self._total_bytes = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM thumbnails").fetchone()[0]
+
+    @staticmethod
+    def key(filepath: str, thumb_size: int) -> Optional[str]:
+        """
+        Build the cache key for a file; returns None if the file cannot be stat'ed.
+        """
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+        raw = f"{os.path.abspath(filepath)}|{stat.st_mtime_ns}|{stat.st_size}|{thumb_size}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the encoded thumbnail for key, or None on a miss.
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM thumbnails WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            return row[0]
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Store an encoded thumbnail. Not committed until flush().
+        """
+        with self._lock:
+            old = self.conn.execute("SELECT bytes FROM thumbnails WHERE key = ?", (key,)).fetchone()
+            if old:
+                self._total_bytes -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO thumbnails (key, data, bytes, last_used) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), len(data), time.time())
+            )
+            self._total_bytes += len(data)
+
+    def flush(self) -> None:
+        """
+        Record last-use times for hits, evict down to max_bytes and commit.
+        """
+        with self._lock:
+            if self._touched:
+                self.conn.executemany(
+                    "UPDATE thumbnails SET last_used = ? WHERE key = ?",
+                    [(used, key) for key, used in self._touched.items()]
+                )
+                self._touched.clear()
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        cursor = self.conn.execute("SELECT key, bytes FROM thumbnails ORDER BY last_used")
+        evicted = []
+        for key, size in cursor:
+            if self._total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        cursor.close()
+        self.conn.executemany("DELETE FROM thumbnails WHERE key = ?", evicted)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,204 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QSize, QBuffer, QByteArray, QIODevice, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+
+import instrumentation
+from perceptual_hash import DHASH_HEIGHT, DHASH_WIDTH, dhash_from_gray
+
+# Edge of the square grid thumbnails; also part of the thumbnail cache key
+THUMBNAIL_SIZE = 128
+
+def encode_image(image: QImage) -> bytes:
+    """
+    Encode a thumbnail for the cache: JPEG, or PNG when it has transparency.
+    """
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    if image.hasAlphaChannel():
+        image.save(buffer, "PNG")
+    else:
+        image.save(buffer, "JPG", 85)
+    buffer.close()
+    return bytes(data)
+
+def load_thumbnail(filepath: str, size: int, cache=None) -> QImage:
+    """
+    Return a thumbnail QImage no larger than size x size, or a null QImage.
+    Uses the ThumbnailCache when given; on a miss the file is decoded at reduced
+    resolution through QImageReader, smoothed down to size and stored in the cache.
+    Only QImage is used, so this is safe to call from worker threads.
+    """
+    key = cache.key(filepath, size) if cache else None
+    if key:
+        data = cache.get(key)
+        if data is not None:
+            image = QImage.fromData(data)
+            if not image.isNull():
+                instrumentation.count("thumbnail.cache_hits")
+                return image
+
+    with instrumentation.timer("thumbnail.decode"):
+        thumb = _decode_thumbnail(filepath, size)
+    if key and not thumb.isNull():
+        cache.put(key, encode_image(thumb))
+    return thumb
+
+def _decode_thumbnail(filepath: str, size: int) -> QImage:
+    reader = QImageReader(filepath)
+    source_size = reader.size()
+    if source_size.isValid() and (source_size.width() > 2 * size or source_size.height() > 2 * size):
+        # Let the decoder downscale (e.g. JPEG DCT scaling), leaving headroom for a smooth final pass
+        reader.setScaledSize(source_size.scaled(QSize(2 * size, 2 * size), Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return image
+    return image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+def perceptual_hash(image: QImage) -> int:
+    """
+    Return the 64-bit dHash of an image (normally a thumbnail).
+    Qt does the 9x8 smooth downscale and grayscale conversion; only 72 pixels reach Python.
+    """
+    small = image.scaled(DHASH_WIDTH, DHASH_HEIGHT, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    small = small.convertToFormat(QImage.Format_Grayscale8)
+    bits = small.constBits()
+    bits.setsize(small.bytesPerLine() * DHASH_HEIGHT)
+    # Scan lines are padded to 4 bytes, so rows are read with the real stride
+    return dhash_from_gray(bytes(bits), small.bytesPerLine())
+
+def thumbnail_hash(filepath: str, size: int, cache=None) -> Optional[int]:
+    """
+    Return the perceptual hash of a file's thumbnail (made and cached on a miss),
+    or None if the file cannot be decoded. Safe to call from worker threads.
+    """
+    thumbnail = load_thumbnail(filepath, size, cache)
+    return None if thumbnail.isNull() else perceptual_hash(thumbnail)
+
+class ThumbnailSignals(QObject):
+    # generation, row, thumbnail (null QImage if the file cannot be decoded), perceptual hash or None
+    ready = pyqtSignal(int, int, QImage, object)
+
+class ThumbnailTask(QRunnable):
+    """
+    Decodes one thumbnail on a pool thread and reports it through ThumbnailSignals.
+    """
+
+    def __init__(self, signals, cache, generation, row, filepath, size):
+        super().__init__()
+        # Ownership stays with Thumbnailer so queued tasks can be taken back
+        self.setAutoDelete(False)
+        self.signals = signals
+        self.cache = cache
+        self.generation = generation
+        self.row = row
+        self.filepath = filepath
+        self.size = size
+
+    def run(self):
+        phash = None
+        try:
+            image = load_thumbnail(self.filepath, self.size, self.cache)
+            if not image.isNull():
+                phash = perceptual_hash(image)
+        except Exception as e:
+            print(f"Error creating thumbnail for {self.filepath}: {e}")
+            image = QImage()
+        self.signals.ready.emit(self.generation, self.row, image, phash)
+
+class Thumbnailer(QObject):
+    """
+    Produces grid thumbnails on a QThreadPool.
+    Callers request the rows they currently need; queued work for rows that are
+    no longer requested is taken back from the pool before it starts.
+    Results from before the last reset() are dropped.
+    """
+
+    # row, thumbnail
+    thumbnail_ready = pyqtSignal(int, QImage)
+    # row, perceptual hash of the thumbnail (see perceptual_hash)
+    perceptual_hash_ready = pyqtSignal(int, object)
+    # Emitted when the queue drains, with the thumbnail cache (hits, misses)
+    finished = pyqtSignal(int, int)
+
+    def __init__(self, cache=None, size: int = 128, parent=None, max_threads: Optional[int] = None):
+        super().__init__(parent)
+        self.cache = cache
+        self.size = size
+        self.pool = QThreadPool(self)
+        if max_threads:
+            self.pool.setMaxThreadCount(max_threads)
+        self.generation = 0
+        self._pending: Dict[int, ThumbnailTask] = {}
+        # Tasks from before a reset() that a pool thread may be running; the Python
+        # reference keeps each one alive until its result arrives
+        self._retired: Dict[Tuple[int, int], ThumbnailTask] = {}
+        self._signals = ThumbnailSignals(self)
+        self._signals.ready.connect(self._on_ready)
+        # Single hashes asked for outside the grid's requests (see hash_file)
+        self._hash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnail-hash')
+
+    def reset(self):
+        """
+        Drop all queued work and ignore results of tasks already running.
+        """
+        for row, task in self._pending.items():
+            if not self.pool.tryTake(task):
+                # Already running (or done with its result still queued): freeing it now
+                # would delete a QRunnable a pool thread is using
+                self._retired[(self.generation, row)] = task
+        self.generation += 1
+        self._pending.clear()
+        if self.cache:
+            self.cache.reset_stats()
+
+    def request(self, rows: List[Tuple[int, str]], visible: int):
+        """
+        Queue thumbnails for (row, filepath) pairs, in priority order.
+        The first `visible` pairs are on screen and go ahead of the prefetch margin.
+        Anything queued earlier for rows not in this request is cancelled.
+        """
+        wanted = {row for row, _ in rows}
+        for row, task in list(self._pending.items()):
+            if row not in wanted and self.pool.tryTake(task):
+                del self._pending[row]
+        count = len(rows)
+        for index, (row, filepath) in enumerate(rows):
+            if row in self._pending:
+                continue
+            task = ThumbnailTask(self._signals, self.cache, self.generation, row, filepath, self.size)
+            self._pending[row] = task
+            # Higher priority runs first; on-screen rows outrank the margin
+            priority = count - index + (count if index < visible else 0)
+            self.pool.start(task, priority)
+
+    def hash_file(self, filepath: str) -> Future:
+        """
+        Compute the perceptual hash of a file's thumbnail (see thumbnail_hash) off the GUI thread.
+        """
+        return self._hash_executor.submit(thumbnail_hash, filepath, self.size, self.cache)
+
+    def shutdown(self):
+        """
+        Cancel queued work and wait for running tasks; call before closing the cache.
+        """
+        self.reset()
+        self.pool.waitForDone()
+        self._hash_executor.shutdown(wait=True)
+
+    def _on_ready(self, generation, row, image, phash):
+        if generation != self.generation:
+            self._retired.pop((generation, row), None)
+            return
+        self._pending.pop(row, None)
+        self.thumbnail_ready.emit(row, image)
+        if phash is not None:
+            self.perceptual_hash_ready.emit(row, phash)
+        if not self._pending:
+            if self.cache:
+                self.cache.flush()
+                self.finished.emit(self.cache.hits, self.cache.misses)
+            else:
+                self.finished.emit(0, 0)